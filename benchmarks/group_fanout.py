@@ -0,0 +1,122 @@
+"""Group message delivery time for 10, 100, 1,000 and 10,000 members, before and after.
+
+Runs process_group_message end to end on one SQS record, against in-memory table
+stand-ins that sleep for one round trip per request. The previous handler read the
+member list off the group item and appended the message to each member's
+received_messages with one blocking update after another. The current one is run
+with the fan-out-on-read threshold set explicitly per column: above the group size,
+so every member gets an inbox entry on the adaptive fan_out pool, and at the default,
+where groups past it are stored once in their timeline. A last run caps the Inbox
+stand-in at a number of concurrent requests and throttles the rest, to show the
+chunks backing off instead of failing:
+
+    python benchmarks/group_fanout.py --latency-ms 2 --throttle-at 16
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-north-1')
+
+from shared import delivery, group_cache, group_members, group_timeline, idempotency, inbox, search_index, unread_counts
+from shared.dynamodb_client import put_item_with_retry, update_item_with_retry
+from benchmarks.local_tables import LocalTable
+
+GROUP_SIZES = [10, 100, 1000, 10000]
+DEFAULT_THRESHOLD = group_timeline.fanout_on_read_threshold
+GROUP_ID = 'group-1'
+SENDER_ID = 'user-0'
+
+def load_handler():
+    spec = importlib.util.spec_from_file_location('process_group_message', os.path.join(ROOT, 'process_group_message', 'lambda_function.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def deliver_serially(members, latency):
+    # The previous handler: group item, message item, then one update per member
+    groups_table = LocalTable('Groups', latency, items=[{'group_id': GROUP_ID, 'members': members}])
+    messages_table = LocalTable('Messages', latency)
+    users_table = LocalTable('Users', latency)
+    members = groups_table.get_item(Key={'group_id': GROUP_ID})['Item']['members']
+    message_id = str(uuid.uuid4())
+    put_item_with_retry(messages_table, {'message_id': message_id, 'group_id': GROUP_ID, 'message': 'benchmark'})
+    for member in members:
+        update_item_with_retry(users_table, {'user_id': member},
+                               'SET received_messages = list_append(if_not_exists(received_messages, :empty_list), :new_message_id)',
+                               {':new_message_id': [message_id], ':empty_list': []})
+
+def use_tables(handler, members, latency, fanout_on_read, max_in_flight=None):
+    group_item = {'group_id': GROUP_ID, 'member_count': len(members), 'membership_version': 1}
+    if fanout_on_read:
+        # Steady state: the switch and its subscriptions happened on an earlier message
+        group_item['fanout_on_read'] = True
+    group_cache.local_group_memberships.clear()
+    group_cache.groups_table = LocalTable('Groups', latency, items=[group_item])
+    group_members.group_members_table = LocalTable('GroupMembers', latency, items=[
+        {'group_id': GROUP_ID, 'user_id': member} for member in members
+    ])
+    idempotency.processed_messages_table = LocalTable('ProcessedMessages', latency)
+    handler.messages_table = LocalTable('Messages', latency)
+    delivery.inbox_table = LocalTable('Inbox', latency, max_in_flight)
+    inbox.users_table = LocalTable('Users', latency)
+    unread_counts.unread_counts_table = LocalTable('UnreadCounts', latency)
+    search_index.search_index_table = LocalTable('SearchIndex', latency)
+    group_timeline.groups_table = LocalTable('Groups', latency)
+    group_timeline.group_timeline_table = LocalTable('GroupTimeline', latency)
+
+def process(handler, members, threshold, latency, max_in_flight=None):
+    # Returns the time taken and the members whose delivery failed
+    group_timeline.fanout_on_read_threshold = threshold
+    use_tables(handler, members, latency, len(members) > threshold, max_in_flight)
+    failed = set()
+    deliver_to_inboxes = delivery.deliver_to_inboxes
+
+    def recording(deliveries):
+        failed_receivers, unwritten = deliver_to_inboxes(deliveries)
+        failed.update(failed_receivers)
+        return failed_receivers, unwritten
+
+    delivery.deliver_to_inboxes = recording
+    record = {'messageId': str(uuid.uuid4()), 'body': json.dumps({'sender_id': SENDER_ID, 'group_id': GROUP_ID, 'message': 'benchmark'})}
+    try:
+        elapsed_ms, _ = timed(lambda: handler.lambda_handler({'Records': [record]}, None))
+    finally:
+        delivery.deliver_to_inboxes = deliver_to_inboxes
+    return elapsed_ms, failed
+
+def timed(run):
+    started = time.perf_counter()
+    result = run()
+    return (time.perf_counter() - started) * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency-ms', type=float, default=2.0)
+    parser.add_argument('--throttle-at', type=int, default=16)
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+    handler = load_handler()
+
+    print(f'{"members":>7} | {"serial loop":>11} | {"on write":>10} | {"threshold " + str(DEFAULT_THRESHOLD):>22} | '
+          f'{"on write, throttled at " + str(args.throttle_at):>36}')
+    for size in GROUP_SIZES:
+        members = [f'user-{i}' for i in range(size)]
+        serial_ms, _ = timed(lambda: deliver_serially(members, latency))
+        on_write_ms, _ = process(handler, members, size, latency)
+        default_ms, _ = process(handler, members, DEFAULT_THRESHOLD, latency)
+        default_path = 'on read' if size > DEFAULT_THRESHOLD else 'on write'
+        throttled_ms, failed = process(handler, members, size, latency, args.throttle_at)
+
+        print(f'{size:>7} | {serial_ms:>8.0f} ms | {on_write_ms:>7.0f} ms | {default_ms:>7.0f} ms ({default_path:>8}) | '
+              f'{throttled_ms:>7.0f} ms {size - len(failed):>5} ok {len(failed):>3} failed '
+              f'{delivery.inbox_table.throttled:>4} throttles')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import threading
+import time
+from botocore.exceptions import ClientError
+
+class LocalTable:
+    # Stands in for a DynamoDB Table resource in the benchmarks: every request
+    # costs one simulated round trip and is counted. With max_in_flight set, requests
+    # beyond that many concurrent ones are rejected the way a throttled table would.
+    # Reads are served from `items`, taken to be a single partition in key order;
+    # writes are counted but not stored
+    def __init__(self, name, latency, max_in_flight=None, items=None):
+        self.name = name
+        self.latency = latency
+        self.max_in_flight = max_in_flight
+        self.items = items or []
+        self.requests = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def request(self):
+        with self.lock:
+            if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+                self.throttled += 1
+                raise ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException',
+                                             'Message': 'Simulated throttling'}}, 'LocalTable')
+            self.requests += 1
+            self.in_flight += 1
+        try:
+            time.sleep(self.latency)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def update_item(self, **kwargs):
+        self.request()
+
+    def put_item(self, **kwargs):
+        self.request()
+
+    def get_item(self, Key, **kwargs):
+        self.request()
+        for item in self.items:
+            if all(item.get(name) == value for name, value in Key.items()):
+                return {'Item': item}
+        return {}
+
+    def query(self, Limit=None, ExclusiveStartKey=None, **kwargs):
+        # The key condition is not evaluated; pages follow Limit like DynamoDB's
+        self.request()
+        start = ExclusiveStartKey['offset'] if ExclusiveStartKey else 0
+        end = min(start + Limit, len(self.items)) if Limit else len(self.items)
+        response = {'Items': self.items[start:end], 'Count': end - start}
+        if end < len(self.items):
+            response['LastEvaluatedKey'] = {'offset': end}
+        return response
+
+    @property
+    def meta(self):
+        # batch_write_chunk goes through table.meta.client
+        return self
+
+    @property
+    def client(self):
+        return self
+
+    def batch_write_item(self, RequestItems):
+        self.request()
+        return {'UnprocessedItems': {}}
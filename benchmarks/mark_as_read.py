@@ -0,0 +1,78 @@
+"""Read-marking latency for 10, 100 and 1,000-message inboxes, before and after.
+
+Runs against an in-memory table stand-in that sleeps for one round trip per
+request, so the numbers reflect request count and parallelism rather than
+DynamoDB itself:
+
+    python benchmarks/mark_as_read.py --latency-ms 5
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-north-1')
+
+from shared import read_acks, read_state, unread_counts
+from shared.dynamodb_client import update_item_with_retry
+from benchmarks.local_tables import LocalTable
+
+INBOX_SIZES = [10, 100, 1000]
+GROUP_COUNT = 5
+
+def build_inbox(size):
+    # Half 1:1 messages, half spread across a handful of groups
+    inbox_entries = []
+    messages = []
+    for i in range(size):
+        message_id = f'{i:026d}'
+        inbox_entries.append({'user_id': 'user', 'sort_key': message_id, 'message_id': message_id})
+        message = {'message_id': message_id, 'sender_id': f'sender-{i % GROUP_COUNT}'}
+        if i % 2:
+            message['group_id'] = f'group-{i % GROUP_COUNT}'
+        messages.append(message)
+    return inbox_entries, messages
+
+def mark_per_message(messages_table, user_id, messages):
+    # The previous path: one is_read update per fetched message, issued serially
+    for message in messages:
+        if 'group_id' in message:
+            update_item_with_retry(messages_table, {'message_id': message['message_id']},
+                                   'SET is_read.#user_id = :true', {':true': True},
+                                   expression_attribute_names={'#user_id': user_id})
+        else:
+            update_item_with_retry(messages_table, {'message_id': message['message_id']},
+                                   'SET is_read = :true', {':true': True})
+
+def timed(run):
+    started = time.perf_counter()
+    run()
+    return (time.perf_counter() - started) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency-ms', type=float, default=5.0)
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+
+    # Without an ack queue the whole acknowledgement is applied inline and timed
+    read_acks.ack_queue = None
+
+    print(f'{"inbox":>6} | {"per-message":>20} | {"acknowledge_read":>20}')
+    for size in INBOX_SIZES:
+        inbox_entries, messages = build_inbox(size)
+
+        messages_table = LocalTable('Messages', latency)
+        before_ms = timed(lambda: mark_per_message(messages_table, 'user', messages))
+
+        read_state.users_table = LocalTable('Users', latency)
+        unread_counts.unread_counts_table = LocalTable('UnreadCounts', latency)
+        after_ms = timed(lambda: read_acks.acknowledge_read({'user_id': 'user'}, inbox_entries, messages))
+        after_requests = read_state.users_table.requests + unread_counts.unread_counts_table.requests
+
+        print(f'{size:>6} | {before_ms:>9.1f} ms {messages_table.requests:>4} req | '
+              f'{after_ms:>9.1f} ms {after_requests:>4} req')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Offline load test of the read-ack pipeline.
+
+Simulates many get-handler fetches, each advancing its cursor and enqueueing
+an ack onto the in-memory LocalAckQueue, then drains the queue through the
+process_read_ack handler in SQS-sized batches against table stand-ins,
+reporting acks versus unread counter writes:
+
+    python benchmarks/read_ack_pipeline.py --users 50 --fetches-per-user 20
+"""
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-north-1')
+
+from shared import read_acks, read_state, unread_counts
+from shared.message_ids import derived_message_id
+from benchmarks.local_tables import LocalTable
+
+def load_consumer():
+    spec = importlib.util.spec_from_file_location('process_read_ack', os.path.join(ROOT, 'process_read_ack', 'lambda_function.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def simulate_fetch(user_id, group_ids):
+    message_ids = [derived_message_id(int(time.time() * 1000), str(uuid.uuid4())) for _ in range(random.randint(1, 5))]
+    inbox_entries = [{'user_id': user_id, 'sort_key': message_id, 'message_id': message_id} for message_id in message_ids]
+    messages = [{'message_id': message_id, 'sender_id': 'sender', 'group_id': random.choice(group_ids)} if random.random() < 0.5
+                else {'message_id': message_id, 'sender_id': 'sender'} for message_id in message_ids]
+    read_acks.acknowledge_read({'user_id': user_id}, inbox_entries, messages)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--fetches-per-user', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=5.0)
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+
+    read_acks.ack_queue = read_acks.LocalAckQueue()
+    read_state.users_table = LocalTable('Users', latency)
+    unread_counts.unread_counts_table = LocalTable('UnreadCounts', latency)
+    consumer = load_consumer()
+
+    user_ids = [f'user-{i}' for i in range(args.users)]
+    group_ids = [f'group-{i}' for i in range(5)]
+    fetches = [user_id for user_id in user_ids for _ in range(args.fetches_per_user)]
+    random.shuffle(fetches)
+
+    started = time.perf_counter()
+    for user_id in fetches:
+        simulate_fetch(user_id, group_ids)
+    enqueue_ms = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    batches = 0
+    for event in read_acks.ack_queue.drain(args.batch_size):
+        consumer.lambda_handler(event, None)
+        batches += 1
+    drain_ms = (time.perf_counter() - started) * 1000
+
+    print(f'acks enqueued:     {len(fetches)} in {enqueue_ms:.1f} ms ({enqueue_ms * 1000 / len(fetches):.1f} us per fetch)')
+    print(f'batches consumed:  {batches} in {drain_ms:.1f} ms')
+    print(f'cursor writes:     {read_state.users_table.requests} on the request path')
+    print(f'counter writes:    {unread_counts.unread_counts_table.requests}')
+
+if __name__ == '__main__':
+    main()
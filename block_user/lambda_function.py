@@ -1,29 +1,24 @@
 import json
 import boto3
 import os
-from shared.dynamodb_client import get_dynamodb_table, put_item_with_retry, get_item_with_retry
+from shared.blocks import add_block
+from shared.users import users_exist
 
 dynamodb = boto3.resource('dynamodb')
-blocks_table = get_dynamodb_table('Blocks')
-users_table = get_dynamodb_table('Users')
-
-def user_exists(user_id):
-    response = get_item_with_retry(users_table, {'user_id': user_id})
-    return 'Item' in response
 
 def lambda_handler(event, context):
     body = json.loads(event['body'])
     user_id = body['user_id']
     blocked_user_id = body['blocked_user_id']
 
-    if not user_exists(user_id) or not user_exists(blocked_user_id):
+    if not all(users_exist([user_id, blocked_user_id]).values()):
         return {
             'statusCode': 400,
             'body': json.dumps({'error': 'User or blocked user does not exist'})
         }
 
     try:
-        put_item_with_retry(blocks_table, {'user_id': user_id, 'blocked_user_id': blocked_user_id})
+        add_block(user_id, blocked_user_id)
         return {
             'statusCode': 200,
             'body': json.dumps({'message': 'User blocked successfully'})
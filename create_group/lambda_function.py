@@ -1,14 +1,11 @@
 import json
 import uuid
-from shared.dynamodb_client import get_dynamodb_table, put_item_with_retry, get_item_with_retry
+from shared.dynamodb_client import get_dynamodb_table, put_item_with_retry
+from shared.group_members import add_group_members
+from shared.users import users_exist
 
-users_table = get_dynamodb_table('Users')
 groups_table = get_dynamodb_table('Groups')
 
-def user_exists(user_id):
-    response = get_item_with_retry(users_table, {'user_id': user_id})
-    return 'Item' in response
-
 def lambda_handler(event, context):
     body = json.loads(event['body'])
     group_id = str(uuid.uuid4())
@@ -16,8 +13,9 @@ def lambda_handler(event, context):
     creator_id = body['creator_id']
     members = body.get('members', [])
     
-    # Check if creator exists
-    if not user_exists(creator_id):
+    # Check the creator and all members in one call
+    existence = users_exist([creator_id] + members)
+    if not existence[creator_id]:
         return {
             'statusCode': 400,
             'body': json.dumps({'error': f'Creator with ID {creator_id} does not exist'})
@@ -28,7 +26,7 @@ def lambda_handler(event, context):
     
     # Check if all members exist
     for member in members:
-        if not user_exists(member):
+        if not existence[member]:
             return {
                 'statusCode': 400,
                 'body': json.dumps({'error': f'Member with ID {member} does not exist'})
@@ -40,8 +38,9 @@ def lambda_handler(event, context):
             'group_id': group_id,
             'group_name': group_name,
             'creator_id': creator_id,
-            'members': members
+            'member_count': len(members)
         })
+        add_group_members(group_id, members)
     except Exception as e:
         print(f"Error putting item in DynamoDB: {e}")
         return {
@@ -100,6 +100,7 @@ def main():
     lambda_functions = {
         'RegisterUserFunction': 'register_user',
         'SendMessageFunction': 'send_message',
+        'SendMessageBatchFunction': 'send_message_batch',
         'ProcessUserMessageFunction': 'process_user_message',
         'SendGroupMessageFunction': 'send_group_message',
         'ProcessGroupMessageFunction': 'process_group_message',
@@ -108,7 +109,11 @@ def main():
         'AddUserToGroupFunction': 'add_user_to_group',
         'RemoveUserFromGroupFunction': 'remove_user_from_group',
         'GetAllMessagesFunction': 'get_all_messages',
-        'GetNewMessagesFunction': 'get_new_messages'
+        'GetNewMessagesFunction': 'get_new_messages',
+        'ProcessReadAckFunction': 'process_read_ack',
+        'SyncFunction': 'sync',
+        'GetUnreadCountsFunction': 'get_unread_counts',
+        'SearchFunction': 'search'
     }
 
     # Install dependencies for shared module
@@ -1,8 +1,18 @@
 import json
-from shared.dynamodb_client import get_dynamodb_table, batch_get_items_with_retry, get_item_with_retry, update_item_with_retry
+from shared.dynamodb_client import get_dynamodb_table, get_item_with_retry
+from shared.messages import fetch_messages, format_message
+from shared.group_timeline import query_merged_inbox
+from shared.read_state import get_read_cursor, skip_read_entries
+from shared.read_acks import acknowledge_read
+from shared.pagination import ORDER_OLDEST, ORDER_NEWEST, ORDERS, encode_page_cursor, decode_page_cursor
 
 users_table = get_dynamodb_table('Users')
-messages_table = get_dynamodb_table('Messages')
+
+# Only the attributes the handler reads are fetched
+USER_ATTRIBUTES = ['user_id', 'read_up_to', 'read_ids', 'timeline_groups', 'received_messages']
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
 
 def lambda_handler(event, context):
     try:
@@ -19,61 +29,80 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Missing user_id in query string parameters'})
             }
 
-        user_response = get_item_with_retry(users_table, {'user_id': user_id})
-        if 'Item' not in user_response:
+        order = event['queryStringParameters'].get('order', ORDER_OLDEST)
+        if order not in ORDERS:
             return {
                 'statusCode': 400,
-                'body': json.dumps({'error': f'User with ID {user_id} does not exist'})
+                'body': json.dumps({'error': f'order must be one of {", ".join(ORDERS)}'})
             }
 
-        message_ids = user_response['Item'].get('received_messages', [])
-        if not message_ids:
+        try:
+            limit = int(event['queryStringParameters'].get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            limit = 0
+        if limit < 1:
             return {
-                'statusCode': 200,
-                'body': json.dumps({'messages': []})
+                'statusCode': 400,
+                'body': json.dumps({'error': 'limit must be a positive integer'})
             }
+        limit = min(limit, MAX_PAGE_SIZE)
 
-        message_keys = [{'message_id': message_id} for message_id in message_ids]
-        response = batch_get_items_with_retry(messages_table, message_keys)
-        messages = response.get('Responses', {}).get('Messages', [])
+        page_start = None
+        cursor = event['queryStringParameters'].get('cursor')
+        if cursor:
+            try:
+                page_start = decode_page_cursor(cursor, order)
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps({'error': 'Invalid cursor'})
+                }
 
-        formatted_messages = []
-        for message in messages:
-            formatted_message = {
-                'message': message['message'],
-                'sender_id': message['sender_id'],
-                'timestamp': message['timestamp']
+        user_response = get_item_with_retry(users_table, {'user_id': user_id}, projection=USER_ATTRIBUTES)
+        if 'Item' not in user_response:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': f'User with ID {user_id} does not exist'})
+            }
+
+        # Read one entry past the page to learn whether another page follows
+        newest_first = order == ORDER_NEWEST
+        inbox_entries = query_merged_inbox(
+            user_response['Item'],
+            after=None if newest_first else page_start,
+            before=page_start if newest_first else None,
+            limit=limit + 1,
+            newest_first=newest_first
+        )
+        next_cursor = None
+        if len(inbox_entries) > limit:
+            inbox_entries = inbox_entries[:limit]
+            next_cursor = encode_page_cursor(inbox_entries[-1]['sort_key'], order)
+
+        if not inbox_entries:
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'messages': [], 'next_cursor': None})
             }
-            if 'group_id' in message:
-                formatted_message['received_from'] = message['sender_id']
-                formatted_message['group_id'] = message['group_id']
-            formatted_messages.append(formatted_message)
 
-            # Mark the message as read for this user
-            is_read = message['is_read']
-            if isinstance(is_read, bool):
-                update_item_with_retry(
-                    messages_table, 
-                    {'message_id': message['message_id']},
-                    'SET is_read = :true',
-                    {':true': True}
-                )
-            elif isinstance(is_read, dict):
-                update_expression = f"SET is_read.#user_id = :true"
-                update_item_with_retry(
-                    messages_table, 
-                    {'message_id': message['message_id']},
-                    update_expression,
-                    {':true': True},
-                    expression_attribute_names={'#user_id': user_id}
-                )
+        messages = fetch_messages(inbox_entries)
+        formatted_messages = [format_message(message) for message in messages]
 
-        # Sort messages by timestamp (oldest first)
-        formatted_messages.sort(key=lambda x: x['timestamp'])
+        # Paging through history does not mark it read. Only an oldest-first page that
+        # starts at or before the read cursor continues on from what was read, and only its
+        # entries past the cursor are acknowledged
+        user_item = user_response['Item']
+        read_cursor = get_read_cursor(user_item)
+        if not newest_first and (page_start is None or page_start <= (read_cursor or '')):
+            new_entries = skip_read_entries(user_item, [entry for entry in inbox_entries if not read_cursor or entry['sort_key'] > read_cursor])
+            new_message_ids = {entry['message_id'] for entry in new_entries}
+            if new_entries:
+                # Advance the read cursor and enqueue the unread counter updates
+                acknowledge_read(user_item, new_entries, [message for message in messages if message['message_id'] in new_message_ids])
 
         return {
             'statusCode': 200,
-            'body': json.dumps({'messages': formatted_messages})
+            'body': json.dumps({'messages': formatted_messages, 'next_cursor': next_cursor})
         }
 
     except Exception as e:
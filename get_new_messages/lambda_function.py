@@ -1,8 +1,15 @@
 import json
-from shared.dynamodb_client import get_dynamodb_table, batch_get_items_with_retry, get_item_with_retry, update_item_with_retry
+from shared.dynamodb_client import get_dynamodb_table, get_item_with_retry
+from shared.messages import fetch_messages, format_message
+from shared.recent_inbox import query_new_entries
+from shared.read_state import get_read_cursor
+from shared.read_acks import acknowledge_read
+from shared.notifications import MAX_WAIT_SECONDS, subscribe_to_new_messages, wait_for_new_messages
 
 users_table = get_dynamodb_table('Users')
-messages_table = get_dynamodb_table('Messages')
+
+# Only the attributes the handler reads are fetched
+USER_ATTRIBUTES = ['user_id', 'read_up_to', 'read_ids', 'timeline_groups', 'received_messages']
 
 def lambda_handler(event, context):
     try:
@@ -19,72 +26,51 @@ def lambda_handler(event, context):
                 'body': json.dumps({'error': 'Missing user_id in query string parameters'})
             }
 
-        user_response = get_item_with_retry(users_table, {'user_id': user_id})
+        try:
+            wait = int(event['queryStringParameters'].get('wait', 0))
+        except ValueError:
+            wait = -1
+        if not 0 <= wait <= MAX_WAIT_SECONDS:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': f'wait must be an integer between 0 and {MAX_WAIT_SECONDS}'})
+            }
+
+        user_response = get_item_with_retry(users_table, {'user_id': user_id}, projection=USER_ATTRIBUTES)
         if 'Item' not in user_response:
             return {
                 'statusCode': 400,
                 'body': json.dumps({'error': f'User with ID {user_id} does not exist'})
             }
 
-        message_ids = user_response['Item'].get('received_messages', [])
-        if not message_ids:
+        # Only entries past the read cursor are new; recent ones come from Redis
+        user_item = user_response['Item']
+        read_cursor = get_read_cursor(user_item)
+        inbox_entries = query_new_entries(user_item, read_cursor)
+        if not inbox_entries and wait:
+            # Long poll: park on the wake-up channels until a delivery or the timeout
+            pubsub = subscribe_to_new_messages(user_item)
+            if pubsub:
+                try:
+                    # Check again now that we are subscribed, so a delivery that landed
+                    # in between is not missed
+                    inbox_entries = query_new_entries(user_item, read_cursor)
+                    if not inbox_entries and wait_for_new_messages(pubsub, wait):
+                        inbox_entries = query_new_entries(user_item, read_cursor)
+                finally:
+                    pubsub.close()
+
+        if not inbox_entries:
             return {
                 'statusCode': 200,
                 'body': json.dumps({'messages': []})
             }
 
-        message_keys = [{'message_id': message_id} for message_id in message_ids]
-        response = batch_get_items_with_retry(messages_table, message_keys)
-        messages = response.get('Responses', {}).get('Messages', [])
-
-        formatted_messages = []
-        for message in messages:
-            is_read = message['is_read']
-            if isinstance(is_read, bool):
-                # Handle individual messages
-                if not is_read:
-                    formatted_message = {
-                        'message': message['message'],
-                        'sender_id': message['sender_id'],
-                        'timestamp': message['timestamp']
-                    }
-                    if 'group_id' in message:
-                        formatted_message['received_from'] = message['sender_id']
-                        formatted_message['group_id'] = message['group_id']
-                    formatted_messages.append(formatted_message)
-
-                    # Mark the message as read for this user
-                    update_item_with_retry(
-                        messages_table, 
-                        {'message_id': message['message_id']},
-                        'SET is_read = :true',
-                        {':true': True}
-                    )
-            elif isinstance(is_read, dict):
-                # Handle group messages
-                if not is_read.get(user_id, False):
-                    formatted_message = {
-                        'message': message['message'],
-                        'sender_id': message['sender_id'],
-                        'timestamp': message['timestamp']
-                    }
-                    if 'group_id' in message:
-                        formatted_message['received_from'] = message['sender_id']
-                        formatted_message['group_id'] = message['group_id']
-                    formatted_messages.append(formatted_message)
-
-                    # Mark the message as read for this user
-                    update_expression = f"SET is_read.#user_id = :true"
-                    update_item_with_retry(
-                        messages_table, 
-                        {'message_id': message['message_id']},
-                        update_expression,
-                        {':true': True},
-                        expression_attribute_names={'#user_id': user_id}
-                    )
+        messages = fetch_messages(inbox_entries)
+        formatted_messages = [format_message(message) for message in messages]
 
-        # Sort messages by timestamp (oldest first)
-        formatted_messages.sort(key=lambda x: x['timestamp'])
+        # Advance the read cursor and enqueue the unread counter updates
+        acknowledge_read(user_item, inbox_entries, messages)
 
         return {
             'statusCode': 200,
@@ -0,0 +1,70 @@
+import json
+from shared.dynamodb_client import get_dynamodb_table, get_item_with_retry
+from shared.group_timeline import count_timeline, timeline_subscriptions
+from shared.read_state import get_read_cursor, get_read_ids
+from shared.unread_counts import MAX_TRACKED_UNREAD, get_unread_counts
+
+users_table = get_dynamodb_table('Users')
+
+USER_ATTRIBUTES = ['user_id', 'read_up_to', 'read_ids', 'timeline_groups']
+
+def format_count(count, more):
+    # Counts are capped; a capped count is reported as a lower bound, e.g. "30+"
+    return f'{count}+' if more else count
+
+def lambda_handler(event, context):
+    try:
+        if 'queryStringParameters' not in event or event['queryStringParameters'] is None:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'Missing query string parameters'})
+            }
+
+        user_id = event['queryStringParameters'].get('user_id')
+        if not user_id:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'Missing user_id in query string parameters'})
+            }
+
+        user_response = get_item_with_retry(users_table, {'user_id': user_id}, projection=USER_ATTRIBUTES)
+        if 'Item' not in user_response:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': f'User with ID {user_id} does not exist'})
+            }
+
+        # Counters cover inbox deliveries; fan-out-on-read groups are counted from their
+        # timelines past the read cursor, less the entries already read above it. Each
+        # count is (unread, whether there are more)
+        users = {}
+        groups = {}
+        for conversation_id, unread in get_unread_counts(user_id).items():
+            kind, conversation = conversation_id.split('#', 1)
+            (groups if kind == 'group' else users)[conversation] = unread
+        read_cursor = get_read_cursor(user_response['Item'])
+        read_ids = get_read_ids(user_response['Item'])
+        for group_id, joined_at in timeline_subscriptions(user_response['Item']).items():
+            count, more = count_timeline(group_id, MAX_TRACKED_UNREAD, after=read_cursor, joined_at=joined_at, exclude=read_ids)
+            tracked, overflow = groups.get(group_id, (0, False))
+            groups[group_id] = (tracked + count, overflow or more)
+
+        users = {sender_id: unread for sender_id, unread in users.items() if unread[0]}
+        groups = {group_id: unread for group_id, unread in groups.items() if unread[0]}
+        counts = list(users.values()) + list(groups.values())
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'unread': format_count(sum(count for count, _ in counts), any(more for _, more in counts)),
+                'users': {sender_id: format_count(*unread) for sender_id, unread in users.items()},
+                'groups': {group_id: format_count(*unread) for group_id, unread in groups.items()}
+            })
+        }
+
+    except Exception as e:
+        print(f"Error retrieving unread counts: {e}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': 'Failed to retrieve unread counts'})
+        }
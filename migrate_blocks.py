@@ -0,0 +1,41 @@
+import boto3
+
+REGION = 'eu-north-1'
+SOURCE_TABLE = 'Blocks'
+TARGET_TABLE = 'BlocksV2'
+
+# One-off backfill from the original Blocks table, keyed on user_id alone, into BlocksV2,
+# keyed on (user_id, blocked_user_id). Run it once the stack update that creates
+# BlocksV2 has finished. The copy is idempotent, so it can be rerun to pick up blocks
+# written by functions that were still running the old code during the update.
+
+def scan_blocks(table):
+    # Yields (user_id, blocked_user_id) pairs; items may also carry a blocked_users list
+    scan_kwargs = {}
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            if item.get('blocked_user_id'):
+                yield item['user_id'], item['blocked_user_id']
+            for blocked_user_id in item.get('blocked_users', []):
+                yield item['user_id'], blocked_user_id
+        if 'LastEvaluatedKey' not in response:
+            return
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def migrate_blocks(source_table, target_table):
+    copied = 0
+    # BatchWriteItem rejects duplicate keys in one request, so repeats are collapsed
+    with target_table.batch_writer(overwrite_by_pkeys=['user_id', 'blocked_user_id']) as batch:
+        for user_id, blocked_user_id in scan_blocks(source_table):
+            batch.put_item(Item={'user_id': user_id, 'blocked_user_id': blocked_user_id})
+            copied += 1
+    return copied
+
+def main():
+    dynamodb = boto3.resource('dynamodb', region_name=REGION)
+    copied = migrate_blocks(dynamodb.Table(SOURCE_TABLE), dynamodb.Table(TARGET_TABLE))
+    print(f'Copied {copied} blocks from {SOURCE_TABLE} to {TARGET_TABLE}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+REGION = 'eu-north-1'
+GROUPS_TABLE = 'Groups'
+GROUP_MEMBERS_TABLE = 'GroupMembers'
+USERS_TABLE = 'Users'
+
+# One-off backfill from the members list kept on each Groups item into GroupMembers,
+# keyed on (group_id, user_id). Run it once the stack update that creates GroupMembers
+# has finished. Each group's member_count is recounted from GroupMembers, its
+# membership_version bumped so cached member lists are reloaded, and the copied list
+# removed so a rerun cannot bring back members who have since left. Every copied member
+# also gets a membership_version bump so sync picks up the group. Rerun it until no
+# groups are reported as changed, to pick up joins written by the old code during the update.
+
+def scan_groups(table):
+    # Yields (group_id, members) for groups that still carry a members list
+    scan_kwargs = {'ProjectionExpression': 'group_id, members'}
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            if 'members' in item:
+                yield item['group_id'], item['members']
+        if 'LastEvaluatedKey' not in response:
+            return
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def count_group_members(group_members_table, group_id):
+    query_kwargs = {'KeyConditionExpression': Key('group_id').eq(group_id), 'Select': 'COUNT'}
+    count = 0
+    while True:
+        response = group_members_table.query(**query_kwargs)
+        count += response['Count']
+        if 'LastEvaluatedKey' not in response:
+            return count
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def migrate_group_members(groups_table, group_members_table, users_table):
+    groups = 0
+    copied = 0
+    changed = 0
+    for group_id, members in scan_groups(groups_table):
+        user_ids = set(members)
+        with group_members_table.batch_writer(overwrite_by_pkeys=['group_id', 'user_id']) as batch:
+            for user_id in user_ids:
+                batch.put_item(Item={'group_id': group_id, 'user_id': user_id})
+        for user_id in user_ids:
+            users_table.update_item(Key={'user_id': user_id},
+                                    UpdateExpression='ADD membership_version :one',
+                                    ExpressionAttributeValues={':one': 1})
+        try:
+            # Joins and leaves made through GroupMembers since the update are counted too
+            groups_table.update_item(Key={'group_id': group_id},
+                                     UpdateExpression='SET member_count = :count ADD membership_version :one REMOVE members',
+                                     ConditionExpression='members = :members',
+                                     ExpressionAttributeValues={':count': count_group_members(group_members_table, group_id),
+                                                                ':one': 1,
+                                                                ':members': members})
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            # The old code appended a member meanwhile; the next run copies it
+            changed += 1
+        groups += 1
+        copied += len(user_ids)
+    return groups, copied, changed
+
+def main():
+    dynamodb = boto3.resource('dynamodb', region_name=REGION)
+    groups, copied, changed = migrate_group_members(dynamodb.Table(GROUPS_TABLE),
+                                                    dynamodb.Table(GROUP_MEMBERS_TABLE),
+                                                    dynamodb.Table(USERS_TABLE))
+    print(f'Copied {copied} members of {groups} groups from {GROUPS_TABLE} to {GROUP_MEMBERS_TABLE}')
+    if changed:
+        print(f'{changed} groups changed during the copy; run again to finish them')
+
+if __name__ == "__main__":
+    main()
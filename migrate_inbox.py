@@ -0,0 +1,101 @@
+from datetime import datetime, timezone
+import boto3
+from botocore.exceptions import ClientError
+from shared.message_ids import derived_message_id
+
+REGION = 'eu-north-1'
+USERS_TABLE = 'Users'
+MESSAGES_TABLE = 'Messages'
+INBOX_TABLE = 'Inbox'
+BATCH_GET_CHUNK_SIZE = 100
+
+# One-off backfill from the received_messages list kept on each Users item into Inbox,
+# one entry per (user_id, sort_key) like deliver_to_inboxes writes. Old message IDs are
+# random UUIDs, so each sort key is derived from the message's timestamp, exactly as
+# shared.inbox.legacy_sort_key does for readers that fall back to the list. A user with
+# no read cursor yet gets one just below their oldest unread message, from the old read
+# flags. The copied list is then removed; rerun until no users are reported as changed,
+# to pick up deliveries written by the old code during the update.
+
+def legacy_sort_key(message):
+    timestamp = datetime.fromisoformat(message['timestamp']).replace(tzinfo=timezone.utc)
+    return derived_message_id(int(timestamp.timestamp() * 1000), message['message_id'])
+
+def legacy_is_read(message, user_id):
+    is_read = message.get('is_read', False)
+    return bool(is_read.get(user_id)) if isinstance(is_read, dict) else bool(is_read)
+
+def scan_users(table):
+    # Yields (user_id, received_messages) for users that still carry the list
+    scan_kwargs = {'ProjectionExpression': 'user_id, received_messages'}
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            if 'received_messages' in item:
+                yield item['user_id'], item['received_messages']
+        if 'LastEvaluatedKey' not in response:
+            return
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def load_messages(dynamodb, message_ids):
+    message_ids = list(set(message_ids))
+    messages = []
+    for start in range(0, len(message_ids), BATCH_GET_CHUNK_SIZE):
+        request_items = {MESSAGES_TABLE: {
+            'Keys': [{'message_id': message_id} for message_id in message_ids[start:start + BATCH_GET_CHUNK_SIZE]],
+            'ProjectionExpression': 'message_id, #timestamp, is_read',
+            'ExpressionAttributeNames': {'#timestamp': 'timestamp'}
+        }}
+        while request_items:
+            response = dynamodb.batch_get_item(RequestItems=request_items)
+            messages.extend(response['Responses'].get(MESSAGES_TABLE, []))
+            request_items = response.get('UnprocessedKeys')
+    return messages
+
+def migrate_inbox(dynamodb):
+    users_table = dynamodb.Table(USERS_TABLE)
+    inbox_table = dynamodb.Table(INBOX_TABLE)
+    users = 0
+    copied = 0
+    changed = 0
+    for user_id, message_ids in scan_users(users_table):
+        entries = sorted(((legacy_sort_key(message), message) for message in load_messages(dynamodb, message_ids)),
+                         key=lambda entry: entry[0])
+        with inbox_table.batch_writer(overwrite_by_pkeys=['user_id', 'sort_key']) as batch:
+            for sort_key, message in entries:
+                batch.put_item(Item={'user_id': user_id, 'sort_key': sort_key, 'message_id': message['message_id']})
+
+        # Everything before the first unread message was read
+        read_up_to = None
+        for sort_key, message in entries:
+            if not legacy_is_read(message, user_id):
+                break
+            read_up_to = sort_key
+        update_expression = 'ADD inbox_version :count REMOVE received_messages'
+        values = {':count': len(entries), ':message_ids': message_ids}
+        if read_up_to:
+            update_expression = 'SET read_up_to = if_not_exists(read_up_to, :cursor) ' + update_expression
+            values[':cursor'] = read_up_to
+        try:
+            users_table.update_item(Key={'user_id': user_id},
+                                    UpdateExpression=update_expression,
+                                    ConditionExpression='received_messages = :message_ids',
+                                    ExpressionAttributeValues=values)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            # The old code delivered another message meanwhile; the next run copies it
+            changed += 1
+        users += 1
+        copied += len(entries)
+    return users, copied, changed
+
+def main():
+    dynamodb = boto3.resource('dynamodb', region_name=REGION)
+    users, copied, changed = migrate_inbox(dynamodb)
+    print(f'Copied {copied} inbox entries of {users} users from {USERS_TABLE} to {INBOX_TABLE}')
+    if changed:
+        print(f'{changed} users received messages during the copy; run again to finish them')
+
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,75 @@
-import json
 import boto3
-import uuid
-from datetime import datetime
-from shared.dynamodb_client import get_dynamodb_table, get_item_with_retry, put_item_with_retry, update_item_with_retry
+from shared.dynamodb_client import get_dynamodb_table, put_item_with_retry
+from shared.delivery import process_records
+from shared.message_ids import message_id_timestamp
+from shared.idempotency import claim_message, record_failed_receivers
+from shared.group_cache import get_group_membership, is_cached_group_member, iter_cached_member_pages
+from shared.group_timeline import should_fanout_on_read, uses_fanout_on_read, switch_to_fanout_on_read, add_to_timeline, advance_timeline_head
+from shared.unread_counts import group_conversation
+from shared.recent_inbox import recent_timeline_key, record_recent
+from shared.search_index import group_owner, index_message
+from shared.notifications import group_channel
 
 dynamodb = boto3.resource('dynamodb')
-groups_table = get_dynamodb_table('Groups')
-users_table = get_dynamodb_table('Users')
 messages_table = get_dynamodb_table('Messages')
 
-def lambda_handler(event, context):
-    for record in event['Records']:
-        body = json.loads(record['body'])
-        sender_id = body['sender_id']
-        group_id = body['group_id']
-        message = body['message']
+def process_message(record, body, claims, wakeups):
+    # Stores the message and returns its inbox deliveries; a fan-out-on-read group is
+    # written to its timeline here and needs none
+    sender_id = body['sender_id']
+    group_id = body['group_id']
+    message = body['message']
 
-        try:
-            response = get_item_with_retry(groups_table, {'group_id': group_id})
-        except Exception as e:
-            continue
-
-        if 'Item' in response:
-            members = response['Item'].get('members', [])
-            if sender_id in members:
-                message_id = str(uuid.uuid4())
-                timestamp = datetime.utcnow().isoformat()
-                message_item = {
-                    'message_id': message_id,
-                    'sender_id': sender_id,
-                    'message': message,
-                    'group_id': group_id,
-                    'timestamp': timestamp,
-                    'is_read': {member: False for member in members}
-                }
-
-                try:
-                    # Put message in Messages table
-                    put_item_with_retry(messages_table, message_item)
-                except Exception as e:
-                    continue
-
-                for member in members:
-                    try:
-                        # Add message ID to member's received messages in Users table
-                        update_item_with_retry(users_table, {'user_id': member},
-                                               'SET received_messages = list_append(if_not_exists(received_messages, :empty_list), :new_message_id)',
-                                               {':new_message_id': [message_id], ':empty_list': []})
-                    except Exception as e:
-                        continue
-
-    return {
-        'statusCode': 200,
-        'body': json.dumps({'status': 'success'})
+    # Always re-check the version: a stale member list would skip new members
+    membership = get_group_membership(group_id, max_age_seconds=0)
+    if membership is None or not is_cached_group_member(membership, sender_id):
+        return []
+
+    # Every attempt at this message reuses the id of its first one, unless it has to
+    # start over under a fresh id for the members an earlier attempt missed
+    dedup_key, message_id, done, receivers = claim_message(record, body)
+    if done:
+        return []
+    claims[record['messageId']] = dedup_key
+    timestamp = message_id_timestamp(message_id)
+    message_item = {
+        'message_id': message_id,
+        'sender_id': sender_id,
+        'message': message,
+        'group_id': group_id,
+        'timestamp': timestamp
     }
+
+    # Put message in Messages table; a retry finds it already there
+    put_item_with_retry(messages_table, message_item, condition_expression='attribute_not_exists(message_id)')
+
+    if should_fanout_on_read(membership['group']):
+        # Large group: store the message once, members merge it at read time
+        if not uses_fanout_on_read(membership['group']):
+            switch_to_fanout_on_read(group_id)
+        try:
+            add_to_timeline(group_id, message_id)
+        except Exception:
+            # No entry was written, and the stored message would otherwise be replayed
+            # under this id, which may already sort below members' read cursors
+            record_failed_receivers({dedup_key: {group_owner(group_id)}})
+            raise
+        advance_timeline_head(group_id, message_id)
+        record_recent([(recent_timeline_key(group_id), message_id)])
+        index_message([group_owner(group_id)], message_id, message)
+        wakeups.append(group_channel(group_id))
+        return []
+
+    return [
+        {
+            'receiver_id': member,
+            'message_id': message_id,
+            'conversation_id': group_conversation(group_id),
+            'message': message
+        }
+        for members in iter_cached_member_pages(membership) for member in members
+        if receivers is None or member in receivers
+    ]
+
+def lambda_handler(event, context):
+    return process_records(event, process_message)
@@ -0,0 +1,26 @@
+import json
+from shared.read_acks import coalesce_read_acks
+from shared.read_state import apply_read_ack
+
+def lambda_handler(event, context):
+    read_acks = []
+    message_ids_by_user = {}
+    for record in event['Records']:
+        try:
+            read_ack = json.loads(record['body'])
+        except ValueError as e:
+            print(f"Dropping malformed read ack {record['messageId']}: {e}")
+            continue
+        read_acks.append(read_ack)
+        message_ids_by_user.setdefault(read_ack['user_id'], []).append(record['messageId'])
+
+    # One counter write per (user, conversation) in the batch; a failed user redelivers only the records that were coalesced into it
+    batch_item_failures = []
+    for read_ack in coalesce_read_acks(read_acks):
+        try:
+            apply_read_ack(read_ack)
+        except Exception as e:
+            print(f"Error applying read ack for user {read_ack['user_id']}: {e}")
+            batch_item_failures.extend({'itemIdentifier': message_id} for message_id in message_ids_by_user[read_ack['user_id']])
+
+    return {'batchItemFailures': batch_item_failures}
@@ -1,7 +1,9 @@
 import json
 import boto3
 import os
-from shared.dynamodb_client import get_dynamodb_table, update_item_with_retry
+from shared.dynamodb_client import get_dynamodb_table, get_item_with_retry
+from shared.group_members import remove_group_member
+from shared.group_timeline import subscribes_members, read_timeline_flags, unsubscribe_from_timeline
 
 dynamodb = boto3.resource('dynamodb')
 groups_table = dynamodb.Table('Groups')
@@ -12,9 +14,7 @@ def lambda_handler(event, context):
     user_id = body['user_id']
 
     try:
-        response = groups_table.get_item(
-            Key={'group_id': group_id}
-        )
+        response = get_item_with_retry(groups_table, {'group_id': group_id}, projection=['group_id'])
     except Exception as e:
         print(f"Error getting group from DynamoDB: {e}")
         return {
@@ -28,28 +28,26 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': 'Group not found'})
         }
 
-    members = response['Item'].get('members', [])
-    if user_id not in members:
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': 'User not in group'})
-        }
-
-    members.remove(user_id)
-
     try:
-        update_item_with_retry(groups_table,
-            {'group_id': group_id},
-            'SET members = :members',
-            {':members': members}
-        )
-        return {
-            'statusCode': 200,
-            'body': json.dumps({'message': 'User removed from group successfully'})
-        }
+        removed = remove_group_member(group_id, user_id)
+        # Checked after the write: a switch to fan-out-on-read that begins later leaves
+        # the departed member out itself
+        if removed and subscribes_members(read_timeline_flags(group_id)):
+            unsubscribe_from_timeline(user_id, group_id)
     except Exception as e:
         print(f"Error updating group in DynamoDB: {e}")
         return {
             'statusCode': 500,
             'body': json.dumps({'error': 'Failed to update group'})
         }
+
+    if not removed:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': 'User not in group'})
+        }
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'message': 'User removed from group successfully'})
+    }
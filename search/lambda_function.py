@@ -0,0 +1,102 @@
+import json
+import re
+from shared.dynamodb_client import get_dynamodb_table, get_item_with_retry
+from shared.messages import fetch_messages, format_message
+from shared.pagination import ORDER_NEWEST, encode_page_cursor, decode_page_cursor
+from shared.search_index import MIN_TERM_LENGTH, MAX_TERM_LENGTH, group_owner, search_postings
+from shared.group_timeline import timeline_subscriptions
+
+users_table = get_dynamodb_table('Users')
+
+USER_ATTRIBUTES = ['user_id', 'timeline_groups']
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_QUERY_TERMS = 10
+
+# Words in the query; a trailing * makes a word a prefix
+QUERY_TERM_PATTERN = re.compile(r'(\w+)(\*?)')
+
+def parse_query(query):
+    terms = []
+    for term, star in QUERY_TERM_PATTERN.findall(query.lower()):
+        if MIN_TERM_LENGTH <= len(term) <= MAX_TERM_LENGTH:
+            terms.append((term, bool(star)))
+    return list(dict.fromkeys(terms))
+
+def lambda_handler(event, context):
+    try:
+        if 'queryStringParameters' not in event or event['queryStringParameters'] is None:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'Missing query string parameters'})
+            }
+
+        user_id = event['queryStringParameters'].get('user_id')
+        if not user_id:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'Missing user_id in query string parameters'})
+            }
+
+        terms = parse_query(event['queryStringParameters'].get('q', ''))
+        if not terms or len(terms) > MAX_QUERY_TERMS:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': f'q must contain between 1 and {MAX_QUERY_TERMS} words of at least {MIN_TERM_LENGTH} characters'})
+            }
+
+        try:
+            limit = int(event['queryStringParameters'].get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'limit must be a positive integer'})
+            }
+        limit = min(limit, MAX_PAGE_SIZE)
+
+        page_start = None
+        cursor = event['queryStringParameters'].get('cursor')
+        if cursor:
+            try:
+                page_start = decode_page_cursor(cursor, ORDER_NEWEST)
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps({'error': 'Invalid cursor'})
+                }
+
+        user_response = get_item_with_retry(users_table, {'user_id': user_id}, projection=USER_ATTRIBUTES)
+        if 'Item' not in user_response:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': f'User with ID {user_id} does not exist'})
+            }
+
+        # The user's own index plus those of their fan-out-on-read groups, from when they
+        # joined; every term must match. One extra id tells whether there is a next page
+        owners = [(user_id, '')] + [(group_owner(group_id), joined_at) for group_id, joined_at in timeline_subscriptions(user_response['Item']).items()]
+        message_ids = search_postings(terms, owners, limit + 1, before=page_start)
+        next_cursor = None
+        if len(message_ids) > limit:
+            message_ids = message_ids[:limit]
+            next_cursor = encode_page_cursor(message_ids[-1], ORDER_NEWEST)
+
+        messages = fetch_messages([{'message_id': message_id, 'sort_key': message_id} for message_id in message_ids])
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'messages': [format_message(message) for message in messages],
+                'next_cursor': next_cursor
+            })
+        }
+
+    except Exception as e:
+        print(f"Error searching messages: {e}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': 'Failed to search messages'})
+        }
@@ -2,23 +2,20 @@ import json
 import boto3
 import uuid
 import os
-from shared.dynamodb_client import get_dynamodb_table, get_item_with_retry, put_item_with_retry
+from shared.group_cache import get_group_membership, is_cached_group_member
+from shared.users import user_exists
 
 dynamodb = boto3.resource('dynamodb')
-users_table = get_dynamodb_table('Users')
-groups_table = get_dynamodb_table('Groups')
 sqs = boto3.client('sqs')
 queue_url = os.getenv('QUEUE_URL')
 
-def user_exists(user_id):
-    response = get_item_with_retry(users_table, {'user_id': user_id})
-    return 'Item' in response
-
 def lambda_handler(event, context):
     body = json.loads(event['body'])
     sender_id = body['sender_id']
     group_id = body['group_id']
     message = body['message']
+    # Optional: retries of a request with the same key are stored and delivered once
+    idempotency_key = body.get('idempotency_key')
     
     # Check if sender exists
     if not user_exists(sender_id):
@@ -27,8 +24,10 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': f'Sender with ID {sender_id} does not exist'})
         }
     
+    # Membership is served from the group membership cache
     try:
-        response = get_item_with_retry(groups_table, {'group_id': group_id})
+        membership = get_group_membership(group_id)
+        is_member = membership is not None and is_cached_group_member(membership, sender_id)
     except Exception as e:
         print(f"Error getting item from DynamoDB: {e}")
         return {
@@ -36,16 +35,12 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': 'Failed to retrieve group'})
         }
 
-    if 'Item' not in response:
-        return {
-            'statusCode': 400,
-            'body': json.dumps({'error': f'Group with ID {group_id} does not exist'})
-        }
-    
-    members = response['Item'].get('members', [])
-
-    # Check if sender is a member of the group
-    if sender_id not in members:
+    if not is_member:
+        if membership is None:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': f'Group with ID {group_id} does not exist'})
+            }
         return {
             'statusCode': 403,
             'body': json.dumps({'error': 'User is not a member of the group'})
@@ -57,7 +52,8 @@ def lambda_handler(event, context):
             MessageBody=json.dumps({
                 'sender_id': sender_id,
                 'group_id': group_id,
-                'message': message
+                'message': message,
+                'idempotency_key': idempotency_key
             })
         )
         return {
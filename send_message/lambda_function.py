@@ -1,36 +1,23 @@
 import json
 import boto3
 import os
-from shared.dynamodb_client import get_dynamodb_table, get_item_with_retry
+from shared.blocks import is_blocked
+from shared.users import users_exist
 
 dynamodb = boto3.resource('dynamodb')
-users_table = get_dynamodb_table('Users')
-blocks_table = get_dynamodb_table('Blocks')
 sqs = boto3.client('sqs')
 queue_url = os.environ['QUEUE_URL']
 
-def user_exists(user_id):
-    response = get_item_with_retry(users_table, {'user_id': user_id})
-    return 'Item' in response
-
-def is_blocked(sender_id, receiver_id):
-    response = blocks_table.query(
-        IndexName='BlockedUserIndex',
-        KeyConditionExpression='blocked_user_id = :blocked_user_id AND user_id = :user_id',
-        ExpressionAttributeValues={
-            ':blocked_user_id': sender_id,
-            ':user_id': receiver_id
-        }
-    )
-    return response['Count'] > 0
-
 def lambda_handler(event, context):
     body = json.loads(event['body'])
     sender_id = body['sender_id']
     receiver_id = body['receiver_id']
     message = body['message']
+    # Optional: retries of a request with the same key are stored and delivered once
+    idempotency_key = body.get('idempotency_key')
 
-    if not user_exists(sender_id) or not user_exists(receiver_id):
+    # Both ids are checked in one call
+    if not all(users_exist([sender_id, receiver_id]).values()):
         return {
             'statusCode': 400,
             'body': json.dumps({'error': 'Sender or receiver does not exist'})
@@ -49,7 +36,8 @@ def lambda_handler(event, context):
             MessageBody=json.dumps({
                 'sender_id': sender_id,
                 'receiver_id': receiver_id,
-                'message': message
+                'message': message,
+                'idempotency_key': idempotency_key
             })
         )
         return {
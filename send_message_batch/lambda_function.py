@@ -0,0 +1,125 @@
+import json
+import boto3
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from shared.blocks import blocked_pairs
+from shared.users import users_exist
+
+sqs = boto3.client('sqs')
+queue_url = os.environ['QUEUE_URL']
+
+MAX_BATCH_MESSAGES = 100
+# SendMessageBatch accepts at most 10 entries and 256 KiB of message bodies per request
+SQS_BATCH_SIZE = 10
+SQS_BATCH_MAX_BYTES = 256 * 1024
+SQS_BATCH_MAX_WORKERS = 10
+SQS_BATCH_MAX_ATTEMPTS = 3
+SQS_BATCH_RETRY_DELAY = 0.1
+
+def error_result(status_code, error):
+    return {'status_code': status_code, 'error': error}
+
+def chunk_entries(entries):
+    # Splits (index, encoded body) pairs into SendMessageBatch-sized chunks by count and
+    # total size
+    chunks = []
+    chunk_bytes = 0
+    for index, message_body in entries:
+        size = len(message_body.encode())
+        if not chunks or len(chunks[-1]) == SQS_BATCH_SIZE or chunk_bytes + size > SQS_BATCH_MAX_BYTES:
+            chunks.append([])
+            chunk_bytes = 0
+        chunks[-1].append((index, message_body))
+        chunk_bytes += size
+    return chunks
+
+def enqueue_chunk(entries):
+    # Sends one SendMessageBatch of (index, encoded message body) pairs and returns
+    # {index: result}. Entries SQS failed on its side are retried with backoff
+    results = {}
+    pending = entries
+    for attempt in range(SQS_BATCH_MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(SQS_BATCH_RETRY_DELAY * 2 ** (attempt - 1))
+        try:
+            response = sqs.send_message_batch(
+                QueueUrl=queue_url,
+                Entries=[{'Id': str(index), 'MessageBody': message_body} for index, message_body in pending]
+            )
+        except Exception as e:
+            print(f"Error sending message batch to SQS: {e}")
+            continue
+
+        for entry in response.get('Successful', []):
+            results[int(entry['Id'])] = {'status_code': 200, 'message_id': entry['MessageId']}
+        retryable = set()
+        for entry in response.get('Failed', []):
+            if entry.get('SenderFault'):
+                results[int(entry['Id'])] = error_result(400, entry.get('Message', 'Rejected by the queue'))
+            else:
+                retryable.add(int(entry['Id']))
+        pending = [(index, message_body) for index, message_body in pending if index in retryable]
+        if not pending:
+            break
+
+    for index, _ in pending:
+        results[index] = error_result(500, 'Failed to send message')
+    return results
+
+def lambda_handler(event, context):
+    body = json.loads(event['body'])
+    messages = body.get('messages')
+    if not isinstance(messages, list) or not 1 <= len(messages) <= MAX_BATCH_MESSAGES:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'error': f'messages must be a list of 1 to {MAX_BATCH_MESSAGES} messages'})
+        }
+
+    # Results keep the order of the request; each carries the status code the single
+    # send_message endpoint would have returned for it
+    results = [None] * len(messages)
+    for index, item in enumerate(messages):
+        if not isinstance(item, dict) or not all(item.get(field) for field in ('sender_id', 'receiver_id', 'message')):
+            results[index] = error_result(400, 'sender_id, receiver_id and message are required')
+
+    # Every sender and receiver in the batch is checked in one call
+    valid = [index for index, result in enumerate(results) if result is None]
+    existence = users_exist([messages[index][field] for index in valid for field in ('sender_id', 'receiver_id')])
+    for index in valid:
+        if not (existence[messages[index]['sender_id']] and existence[messages[index]['receiver_id']]):
+            results[index] = error_result(400, 'Sender or receiver does not exist')
+
+    # Block lists are loaded once per distinct receiver
+    valid = [index for index, result in enumerate(results) if result is None]
+    blocked = blocked_pairs([(messages[index]['sender_id'], messages[index]['receiver_id']) for index in valid])
+    for index in valid:
+        if (messages[index]['sender_id'], messages[index]['receiver_id']) in blocked:
+            results[index] = error_result(403, 'You are blocked by the receiver')
+
+    entries = []
+    for index, result in enumerate(results):
+        if result is not None:
+            continue
+        message_body = json.dumps({
+            'sender_id': messages[index]['sender_id'],
+            'receiver_id': messages[index]['receiver_id'],
+            'message': messages[index]['message'],
+            'idempotency_key': messages[index].get('idempotency_key')
+        })
+        # A message too large for the queue on its own fails by itself
+        if len(message_body.encode()) > SQS_BATCH_MAX_BYTES:
+            results[index] = error_result(400, 'Message is too large')
+        else:
+            entries.append((index, message_body))
+    chunks = chunk_entries(entries)
+    if chunks:
+        with ThreadPoolExecutor(max_workers=min(SQS_BATCH_MAX_WORKERS, len(chunks))) as executor:
+            for chunk_results in executor.map(enqueue_chunk, chunks):
+                for index, result in chunk_results.items():
+                    results[index] = result
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'results': results})
+    }
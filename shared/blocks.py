@@ -0,0 +1,127 @@
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.conditions import Key
+from shared.dynamodb_client import get_dynamodb_table, put_item_with_retry, query_all_with_retry
+from shared.redis_client import get_redis_client
+
+blocks_table = get_dynamodb_table('BlocksV2')
+
+# Blocks are keyed on (user_id, blocked_user_id), so each user's block list is one
+# partition. The check on the send path reads that list as a set from the warm
+# container (an LRU of recent receivers), then Redis, and only queries DynamoDB when
+# neither has it. A block written from another container takes effect within
+# BLOCK_SET_TTL_SECONDS. The table is BlocksV2 because the original Blocks table was
+# keyed on user_id alone; migrate_blocks.py copies its items across.
+
+BLOCK_SET_TTL_SECONDS = 30
+BLOCK_QUERY_MAX_WORKERS = 16
+BLOCK_CACHE_MAX_ENTRIES = 10000
+# Redis sets cannot be empty, so every cached set carries this placeholder member
+LOADED_MARKER = ''
+
+# user_id -> (block set, expires_at)
+local_block_sets = OrderedDict()
+
+def blocks_cache_key(user_id):
+    return f'blocks:{user_id}'
+
+def get_local(user_id):
+    cached = local_block_sets.get(user_id)
+    if cached is None:
+        return None
+    block_set, expires_at = cached
+    if expires_at <= time.time():
+        del local_block_sets[user_id]
+        return None
+    local_block_sets.move_to_end(user_id)
+    return block_set
+
+def set_local(user_id, block_set):
+    local_block_sets[user_id] = (block_set, time.time() + BLOCK_SET_TTL_SECONDS)
+    local_block_sets.move_to_end(user_id)
+    while len(local_block_sets) > BLOCK_CACHE_MAX_ENTRIES:
+        local_block_sets.popitem(last=False)
+
+def load_block_set(user_id):
+    items = query_all_with_retry(blocks_table,
+                                 KeyConditionExpression=Key('user_id').eq(user_id),
+                                 ProjectionExpression='blocked_user_id')
+    return frozenset(item['blocked_user_id'] for item in items)
+
+def get_cached_block_sets(redis_client, user_ids):
+    # One pipelined round trip; lists Redis does not hold are left out
+    try:
+        pipeline = redis_client.pipeline()
+        for user_id in user_ids:
+            pipeline.smembers(blocks_cache_key(user_id))
+        results = pipeline.execute()
+    except Exception as e:
+        print(f"Error reading block sets from Redis: {e}")
+        return {}
+    return {user_id: frozenset(members - {LOADED_MARKER})
+            for user_id, members in zip(user_ids, results) if members}
+
+def cache_block_sets(redis_client, block_sets):
+    try:
+        pipeline = redis_client.pipeline()
+        for user_id, block_set in block_sets.items():
+            key = blocks_cache_key(user_id)
+            pipeline.sadd(key, LOADED_MARKER, *block_set)
+            pipeline.expire(key, BLOCK_SET_TTL_SECONDS)
+        pipeline.execute()
+    except Exception as e:
+        print(f"Error caching block sets in Redis: {e}")
+
+def get_block_sets(user_ids):
+    # Returns {user_id: block set} for every id given. Lists missing from this container
+    # are read from Redis in one round trip, the rest are queried concurrently
+    user_ids = list(dict.fromkeys(user_ids))
+    block_sets = {}
+    for user_id in user_ids:
+        block_set = get_local(user_id)
+        if block_set is not None:
+            block_sets[user_id] = block_set
+
+    missing = [user_id for user_id in user_ids if user_id not in block_sets]
+    if not missing:
+        return block_sets
+
+    redis_client = get_redis_client()
+    loaded = get_cached_block_sets(redis_client, missing) if redis_client else {}
+    unloaded = [user_id for user_id in missing if user_id not in loaded]
+    if unloaded:
+        with ThreadPoolExecutor(max_workers=min(BLOCK_QUERY_MAX_WORKERS, len(unloaded))) as executor:
+            queried = dict(zip(unloaded, executor.map(load_block_set, unloaded)))
+        if redis_client:
+            cache_block_sets(redis_client, queried)
+        loaded.update(queried)
+
+    for user_id, block_set in loaded.items():
+        set_local(user_id, block_set)
+        block_sets[user_id] = block_set
+    return block_sets
+
+def get_block_set(user_id):
+    return get_block_sets([user_id])[user_id]
+
+def is_blocked(sender_id, receiver_id):
+    # True if the receiver has blocked the sender
+    return sender_id in get_block_set(receiver_id)
+
+def blocked_pairs(pairs):
+    # The (sender_id, receiver_id) pairs whose receiver has blocked the sender
+    block_sets = get_block_sets(receiver_id for _, receiver_id in pairs)
+    return {(sender_id, receiver_id) for sender_id, receiver_id in pairs if sender_id in block_sets[receiver_id]}
+
+def add_block(user_id, blocked_user_id):
+    put_item_with_retry(blocks_table, {'user_id': user_id, 'blocked_user_id': blocked_user_id})
+
+    # Drop cached copies so the next check reloads the list
+    local_block_sets.pop(user_id, None)
+    redis_client = get_redis_client()
+    if redis_client:
+        try:
+            redis_client.delete(blocks_cache_key(user_id))
+        except Exception as e:
+            print(f"Error invalidating block set in Redis: {e}")
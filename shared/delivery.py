@@ -0,0 +1,137 @@
+import json
+import time
+from shared.dynamodb_client import BATCH_WRITE_CHUNK_SIZE, UnprocessedItems, batch_write_chunk
+from shared.inbox import inbox_table, bump_inbox_version
+from shared.fanout import fan_out
+from shared.unread_counts import record_unread
+from shared.recent_inbox import recent_inbox_key, record_recent
+from shared.search_index import index_messages
+from shared.idempotency import complete_messages, record_failed_receivers
+from shared.notifications import user_channel, publish_wakeups
+
+# Inbox deliveries from a whole SQS batch are applied together, grouped by receiver.
+# Entries for every receiver go out in 25-item BatchWriteItem requests on the fan_out
+# pool, each chunk retrying only the items DynamoDB left unprocessed, then each
+# receiver gets one inbox_version bump, one write per unread counter, one pipelined
+# round of recent-set updates and one search posting write per term, however many of
+# the batch's messages they received. Writes therefore scale with distinct receivers
+# rather than messages.
+
+def write_inbox_entries(entries):
+    # Returns the entries that could not be written
+    chunks = {index: entries[start:start + BATCH_WRITE_CHUNK_SIZE]
+              for index, start in enumerate(range(0, len(entries), BATCH_WRITE_CHUNK_SIZE))}
+
+    def write_chunk(index):
+        chunks[index] = batch_write_chunk(inbox_table, chunks[index])
+        if chunks[index]:
+            raise UnprocessedItems(f'{len(chunks[index])} inbox entries left unprocessed')
+
+    _, failed = fan_out(list(chunks), write_chunk)
+    return [entry for index in failed for entry in chunks[index]]
+
+def deliver_to_inboxes(deliveries):
+    # Each delivery is a dict with receiver_id, message_id, conversation_id and message.
+    # Returns the receivers whose delivery failed, and the (receiver, message id) pairs
+    # among them whose entries were not written
+    by_receiver = {}
+    for delivery in sorted(deliveries, key=lambda delivery: delivery['message_id']):
+        by_receiver.setdefault(delivery['receiver_id'], []).append(delivery)
+    if not by_receiver:
+        return set(), set()
+
+    started = time.time()
+    # Entries first, so a reader that sees a new version sees them; a receiver missing
+    # any entry gets no bump and is reported failed
+    unwritten = {(entry['user_id'], entry['message_id']) for entry in write_inbox_entries([
+        {'user_id': receiver_id, 'sort_key': delivery['message_id'], 'message_id': delivery['message_id']}
+        for receiver_id, receiver_deliveries in by_receiver.items() for delivery in receiver_deliveries
+    ])}
+    missing = {receiver_id for receiver_id, _ in unwritten}
+    delivered, failed = fan_out([receiver_id for receiver_id in by_receiver if receiver_id not in missing],
+                                lambda receiver_id: bump_inbox_version(receiver_id, len(by_receiver[receiver_id])))
+    failed += list(missing)
+
+    # Every entry that was written is counted, recorded and indexed, bumped or not
+    counters = {}
+    recent = []
+    postings = {}
+    for receiver_id, receiver_deliveries in by_receiver.items():
+        for delivery in receiver_deliveries:
+            if (receiver_id, delivery['message_id']) in unwritten:
+                continue
+            counters.setdefault((receiver_id, delivery['conversation_id']), set()).add(delivery['message_id'])
+            recent.append((recent_inbox_key(receiver_id), delivery['message_id']))
+            postings.setdefault(delivery['message_id'], ([], delivery['message']))[0].append(receiver_id)
+    record_unread(counters)
+    record_recent(recent)
+    index_messages([(owner_ids, message_id, text) for message_id, (owner_ids, text) in postings.items()])
+
+    print(f"Delivered {len(deliveries)} inbox entries to {len(delivered)} receivers, {len(failed)} failed, "
+          f"in {(time.time() - started) * 1000:.0f} ms")
+    return set(failed), unwritten
+
+def process_records(event, process_message):
+    # The SQS batch loop shared by the process handlers. process_message(record, body,
+    # claims, wakeups) stores one message, records its claim and returns its inbox
+    # deliveries. Records are processed independently; only the ones that failed or
+    # missed a receiver are reported back to SQS for redelivery (ReportBatchItemFailures)
+    wakeups = []
+    failed_records = {}
+    claims = {}
+    deliveries = []
+    record_ids = {}
+    for record in event['Records']:
+        try:
+            body = json.loads(record['body'])
+        except ValueError as e:
+            # Redelivering a malformed record cannot help
+            print(f"Dropping malformed message {record['messageId']}: {e}")
+            continue
+
+        try:
+            record_deliveries = process_message(record, body, claims, wakeups)
+        except Exception as e:
+            print(f"Error processing message {record['messageId']}: {e}")
+            failed_records[record['messageId']] = True
+            continue
+        deliveries.extend(record_deliveries)
+        for delivery in record_deliveries:
+            record_ids[delivery['message_id']] = record['messageId']
+
+    # Inbox writes for the whole batch are coalesced per receiver
+    try:
+        failed_receivers, unwritten = deliver_to_inboxes(deliveries)
+    except Exception as e:
+        print(f"Error delivering messages: {e}")
+        # Nothing is known to have been written, so every redelivery starts over under a fresh id
+        failed_receivers = {delivery['receiver_id'] for delivery in deliveries}
+        unwritten = {(delivery['receiver_id'], delivery['message_id']) for delivery in deliveries}
+
+    missed = {}
+    for delivery in deliveries:
+        if delivery['receiver_id'] in failed_receivers:
+            record_id = record_ids[delivery['message_id']]
+            failed_records[record_id] = True
+            receivers = missed.setdefault(claims[record_id], set())
+            if (delivery['receiver_id'], delivery['message_id']) in unwritten:
+                receivers.add(delivery['receiver_id'])
+        else:
+            wakeups.append(user_channel(delivery['receiver_id']))
+
+    # A redelivery of a message that some receivers never got an entry for goes to them
+    # alone, under a fresh id; one whose entries were all written replays under its own
+    try:
+        record_failed_receivers(missed)
+    except Exception as e:
+        print(f"Error recording failed receivers: {e}")
+
+    # Fully delivered messages are done; redeliveries of them are no-ops
+    try:
+        complete_messages([dedup_key for record_id, dedup_key in claims.items() if record_id not in failed_records])
+    except Exception as e:
+        print(f"Error completing messages: {e}")
+
+    # One pipelined round trip wakes every parked reader touched by this batch
+    publish_wakeups(wakeups)
+    return {'batchItemFailures': [{'itemIdentifier': record_id} for record_id in failed_records]}
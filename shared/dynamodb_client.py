@@ -1,5 +1,9 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 import boto3
 from botocore.config import Config
+from botocore.exceptions import ClientError
 from retry import retry
 
 # Configure retry strategy
@@ -16,29 +20,179 @@ dynamodb = boto3.resource('dynamodb', config=retry_config)
 def get_dynamodb_table(table_name):
     return dynamodb.Table(table_name)
 
+# Table resources are not safe to share between threads, but their low-level client is,
+# and it converts values and condition builders the same way. Helpers that may run on a
+# worker pool (batch gets and writes, queries and updates) go through table.meta.client
+
+def projection_kwargs(attributes):
+    # Placeholders keep reserved words such as `timestamp` and `message` usable
+    if not attributes:
+        return {}
+    names = {f'#p{i}': attribute for i, attribute in enumerate(attributes)}
+    return {
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names
+    }
+
+THROTTLING_ERROR_CODES = ('ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded')
+
+class UnprocessedItems(Exception):
+    # DynamoDB left part of a BatchWriteItem unprocessed, which it does under throttling
+    pass
+
+def is_conditional_check_failure(error):
+    return isinstance(error, ClientError) and error.response['Error']['Code'] == 'ConditionalCheckFailedException'
+
+def is_throttling_error(error):
+    if isinstance(error, UnprocessedItems):
+        return True
+    return isinstance(error, ClientError) and error.response['Error']['Code'] in THROTTLING_ERROR_CODES
+
 @retry(tries=5, delay=2, backoff=2)
-def put_item_with_retry(table, item):
-    table.put_item(Item=item)
+def put_item_with_retry(table, item, condition_expression=None):
+    put_kwargs = {'Item': item}
+    if condition_expression:
+        put_kwargs['ConditionExpression'] = condition_expression
+
+    try:
+        table.put_item(**put_kwargs)
+    except ClientError as e:
+        if is_conditional_check_failure(e):
+            return False
+        raise
+    return True
 
 @retry(tries=5, delay=2, backoff=2)
-def get_item_with_retry(table, key):
-    return table.get_item(Key=key)
+def delete_item_with_retry(table, key, condition_expression=None):
+    delete_kwargs = {'Key': key}
+    if condition_expression:
+        delete_kwargs['ConditionExpression'] = condition_expression
+
+    try:
+        table.delete_item(**delete_kwargs)
+    except ClientError as e:
+        if is_conditional_check_failure(e):
+            return False
+        raise
+    return True
 
 @retry(tries=5, delay=2, backoff=2)
-def batch_get_items_with_retry(table, keys):
-    request_items = {table.name: {'Keys': keys}}
-    response = table.meta.client.batch_get_item(RequestItems=request_items)
-    return response
+def get_item_with_retry(table, key, projection=None, consistent_read=False):
+    return table.get_item(Key=key, ConsistentRead=consistent_read, **projection_kwargs(projection))
+
+# BatchGetItem accepts at most 100 keys per request
+BATCH_GET_CHUNK_SIZE = 100
+BATCH_GET_MAX_WORKERS = 8
+UNPROCESSED_KEYS_MAX_ATTEMPTS = 8
+UNPROCESSED_KEYS_BASE_DELAY = 0.05
+UNPROCESSED_KEYS_MAX_DELAY = 2
 
 @retry(tries=5, delay=2, backoff=2)
-def update_item_with_retry(table, key, update_expression, expression_attribute_values, expression_attribute_names=None):
+def batch_get_request_with_retry(requests):
+    # One BatchGetItem, possibly spanning tables: `requests` maps each table to its
+    # (keys, projection). DynamoDB may return part of the request as UnprocessedKeys
+    # under load; keep resubmitting just those keys with full-jitter backoff
+    request_items = {table.name: {'Keys': keys, **projection_kwargs(projection)}
+                     for table, (keys, projection) in requests.items()}
+    responses = {table.name: [] for table in requests}
+    for attempt in range(UNPROCESSED_KEYS_MAX_ATTEMPTS):
+        response = dynamodb.meta.client.batch_get_item(RequestItems=request_items)
+        for table_name, items in response.get('Responses', {}).items():
+            responses[table_name].extend(items)
+        request_items = response.get('UnprocessedKeys')
+        if not request_items:
+            return responses
+        time.sleep(random.uniform(0, min(UNPROCESSED_KEYS_MAX_DELAY, UNPROCESSED_KEYS_BASE_DELAY * 2 ** attempt)))
+    raise RuntimeError(f'Keys still unprocessed after {UNPROCESSED_KEYS_MAX_ATTEMPTS} attempts')
+
+def batch_get_chunk_with_retry(table, keys, projection=None):
+    return batch_get_request_with_retry({table: (keys, projection)})[table.name]
+
+def batch_get_items_with_retry(table, keys, projection=None):
+    # Duplicate keys are rejected by BatchGetItem, so drop them first
+    unique_keys = list({tuple(sorted(key.items())): key for key in keys}.values())
+    chunks = [unique_keys[i:i + BATCH_GET_CHUNK_SIZE] for i in range(0, len(unique_keys), BATCH_GET_CHUNK_SIZE)]
+
+    if len(chunks) <= 1:
+        results = [batch_get_chunk_with_retry(table, chunk, projection) for chunk in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=min(BATCH_GET_MAX_WORKERS, len(chunks))) as executor:
+            results = list(executor.map(lambda chunk: batch_get_chunk_with_retry(table, chunk, projection), chunks))
+
+    items = [item for chunk_items in results for item in chunk_items]
+    return {'Responses': {table.name: items}}
+
+# BatchWriteItem accepts at most 25 items per request
+BATCH_WRITE_CHUNK_SIZE = 25
+
+def batch_write_chunk(table, items):
+    # A single BatchWriteItem attempt of at most 25 puts, for callers that schedule their
+    # own retries. Returns the items DynamoDB left unprocessed
+    response = table.meta.client.batch_write_item(RequestItems={table.name: [{'PutRequest': {'Item': item}} for item in items]})
+    return [request['PutRequest']['Item'] for request in response.get('UnprocessedItems', {}).get(table.name, [])]
+
+@retry(tries=5, delay=2, backoff=2)
+def batch_write_items_with_retry(table, items):
+    # batch_writer splits into 25-item requests and resubmits unprocessed items
+    with table.batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=item)
+
+@retry(tries=5, delay=2, backoff=2)
+def query_with_retry(table, **query_kwargs):
+    return table.meta.client.query(TableName=table.name, **query_kwargs)
+
+def query_all_with_retry(table, **query_kwargs):
+    # Follow LastEvaluatedKey until the key range is exhausted
+    items = []
+    while True:
+        response = query_with_retry(table, **query_kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def query_page_with_retry(table, limit, **query_kwargs):
+    # Reads at most `limit` items, following LastEvaluatedKey only while the page is short
+    items = []
+    while len(items) < limit:
+        response = query_with_retry(table, Limit=limit - len(items), **query_kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return items
+
+@retry(tries=5, delay=2, backoff=2)
+def update_item_with_retry(table, key, update_expression, expression_attribute_values, expression_attribute_names=None, condition_expression=None):
     update_kwargs = {
         'Key': key,
-        'UpdateExpression': update_expression,
-        'ExpressionAttributeValues': expression_attribute_values
+        'UpdateExpression': update_expression
     }
+    # DynamoDB rejects an empty map, as for a plain REMOVE
+    if expression_attribute_values:
+        update_kwargs['ExpressionAttributeValues'] = expression_attribute_values
     if expression_attribute_names:
         update_kwargs['ExpressionAttributeNames'] = expression_attribute_names
+    if condition_expression:
+        update_kwargs['ConditionExpression'] = condition_expression
+
+    try:
+        table.meta.client.update_item(TableName=table.name, **update_kwargs)
+    except ClientError as e:
+        # A failed condition is an answer, not a transient error, so it is not retried
+        if is_conditional_check_failure(e):
+            return False
+        raise
+    return True
 
-    table.update_item(**update_kwargs)
+UPDATE_MAX_WORKERS = 16
 
+def update_items_with_retry(table, updates, max_workers=UPDATE_MAX_WORKERS):
+    # Each update is a dict of update_item_with_retry keyword arguments. Independent
+    # items are written concurrently on a bounded pool sharing the table's client;
+    # results keep the input order
+    if len(updates) <= 1:
+        return [update_item_with_retry(table, **update) for update in updates]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(updates))) as executor:
+        return list(executor.map(lambda update: update_item_with_retry(table, **update), updates))
@@ -0,0 +1,68 @@
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from shared.dynamodb_client import is_throttling_error
+
+# Group fan-out runs member deliveries on a bounded pool with adaptive concurrency:
+# each success widens the window by about one worker per window's worth of successes,
+# and a throttled delivery halves it and pauses new submissions for a full-jitter
+# backoff (additive increase, multiplicative decrease). Failed members go back on the
+# queue until they have used FANOUT_MAX_ATTEMPTS, so one slow or throttled member never
+# holds up the others.
+
+FANOUT_MAX_WORKERS = 32
+FANOUT_INITIAL_WORKERS = 8
+FANOUT_MAX_ATTEMPTS = 4
+FANOUT_BASE_DELAY = 0.05
+FANOUT_MAX_DELAY = 2
+
+def fan_out(members, deliver, max_workers=FANOUT_MAX_WORKERS):
+    # Calls deliver(member) for every member; returns (delivered, failed) member lists
+    pending = deque(members)
+    attempts = {}
+    delivered = []
+    failed = []
+    concurrency = float(min(FANOUT_INITIAL_WORKERS, max_workers))
+    backoffs = 0
+    resume_at = 0
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or in_flight:
+            now = time.time()
+            if now >= resume_at:
+                while pending and len(in_flight) < int(concurrency):
+                    member = pending.popleft()
+                    in_flight[executor.submit(deliver, member)] = member
+            if not in_flight:
+                time.sleep(resume_at - now)
+                continue
+
+            # Wake up either on a completion or when a backoff ends with work queued
+            timeout = resume_at - now if pending and resume_at > now else None
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                member = in_flight.pop(future)
+                error = future.exception()
+                if error is None:
+                    delivered.append(member)
+                    concurrency = min(max_workers, concurrency + 1 / concurrency)
+                    if time.time() >= resume_at:
+                        # Succeeding again after the pause: the next throttle starts a fresh backoff
+                        backoffs = 0
+                    continue
+
+                attempts[member] = attempts.get(member, 0) + 1
+                if is_throttling_error(error) and time.time() >= resume_at:
+                    # Deliveries already in flight may be throttled too; back off once per window
+                    backoffs += 1
+                    concurrency = max(1.0, concurrency / 2)
+                    resume_at = time.time() + random.uniform(0, min(FANOUT_MAX_DELAY, FANOUT_BASE_DELAY * 2 ** backoffs))
+                if attempts[member] >= FANOUT_MAX_ATTEMPTS:
+                    print(f"Giving up on delivery to {member} after {attempts[member]} attempts: {error}")
+                    failed.append(member)
+                else:
+                    pending.append(member)
+
+    return delivered, failed
@@ -0,0 +1,101 @@
+import json
+import time
+from collections import OrderedDict
+from shared.dynamodb_client import get_dynamodb_table, get_item_with_retry
+from shared.group_members import is_group_member, iter_group_member_pages
+from shared.redis_client import get_redis_client
+
+groups_table = get_dynamodb_table('Groups')
+
+# Membership cache for the group message path. Every join or leave bumps the group's
+# membership_version, and member lists are cached under (group, version), in the warm
+# container and in Redis, so a cached list never needs invalidating: once the version
+# moves, the old entry is simply no longer looked up. The group item itself is a small
+# projected read, re-checked at most every VERSION_CHECK_INTERVAL_SECONDS per container
+# on the send path; delivery re-checks it every time so a new member is never skipped.
+# Groups too large to hold in memory cache only the group item and fall back to point
+# lookups and paged member queries. The container keeps the GROUP_CACHE_MAX_ENTRIES most
+# recently used groups.
+
+GROUP_ATTRIBUTES = ['group_id', 'member_count', 'fanout_on_read', 'membership_version']
+VERSION_CHECK_INTERVAL_SECONDS = 2
+MEMBER_CACHE_MAX_MEMBERS = 1000
+REDIS_MEMBERS_TTL_SECONDS = 3600
+# Each entry may hold up to MEMBER_CACHE_MAX_MEMBERS ids
+GROUP_CACHE_MAX_ENTRIES = 1000
+
+# group_id -> {'group': projected group item, 'members': frozenset or None, 'checked_at': time}
+local_group_memberships = OrderedDict()
+
+def group_members_cache_key(group_id, membership_version):
+    return f'group-members:{group_id}:{membership_version}'
+
+def membership_version(group_item):
+    return int(group_item.get('membership_version', 0))
+
+def get_cached_members(redis_client, key):
+    try:
+        value = redis_client.get(key)
+    except Exception as e:
+        print(f"Error reading group members from Redis: {e}")
+        return None
+    return frozenset(json.loads(value)) if value else None
+
+def cache_members(redis_client, key, members):
+    try:
+        redis_client.set(key, json.dumps(sorted(members)), ex=REDIS_MEMBERS_TTL_SECONDS)
+    except Exception as e:
+        print(f"Error caching group members in Redis: {e}")
+
+def load_members(group_item):
+    if group_item.get('member_count', 0) > MEMBER_CACHE_MAX_MEMBERS:
+        return None
+
+    redis_client = get_redis_client()
+    key = group_members_cache_key(group_item['group_id'], membership_version(group_item))
+    members = get_cached_members(redis_client, key) if redis_client else None
+    if members is None:
+        members = frozenset(member for members in iter_group_member_pages(group_item['group_id']) for member in members)
+        if redis_client:
+            cache_members(redis_client, key, members)
+    return members
+
+def set_local(group_id, membership):
+    local_group_memberships[group_id] = membership
+    local_group_memberships.move_to_end(group_id)
+    while len(local_group_memberships) > GROUP_CACHE_MAX_ENTRIES:
+        local_group_memberships.popitem(last=False)
+
+def get_group_membership(group_id, max_age_seconds=None):
+    # Returns None if the group does not exist
+    if max_age_seconds is None:
+        max_age_seconds = VERSION_CHECK_INTERVAL_SECONDS
+    cached = local_group_memberships.get(group_id)
+    if cached and cached['checked_at'] + max_age_seconds > time.time():
+        local_group_memberships.move_to_end(group_id)
+        return cached
+
+    response = get_item_with_retry(groups_table, {'group_id': group_id}, projection=GROUP_ATTRIBUTES)
+    if 'Item' not in response:
+        local_group_memberships.pop(group_id, None)
+        return None
+    group_item = response['Item']
+
+    if cached and membership_version(cached['group']) == membership_version(group_item):
+        members = cached['members']
+    else:
+        members = load_members(group_item)
+
+    membership = {'group': group_item, 'members': members, 'checked_at': time.time()}
+    set_local(group_id, membership)
+    return membership
+
+def is_cached_group_member(membership, user_id):
+    if membership['members'] is None:
+        return is_group_member(membership['group']['group_id'], user_id)
+    return user_id in membership['members']
+
+def iter_cached_member_pages(membership):
+    if membership['members'] is None:
+        return iter_group_member_pages(membership['group']['group_id'])
+    return iter([sorted(membership['members'])])
@@ -0,0 +1,82 @@
+from boto3.dynamodb.conditions import Key
+from shared.dynamodb_client import get_dynamodb_table, get_item_with_retry, put_item_with_retry, delete_item_with_retry, batch_write_items_with_retry, update_item_with_retry, update_items_with_retry, query_with_retry, query_all_with_retry
+
+groups_table = get_dynamodb_table('Groups')
+users_table = get_dynamodb_table('Users')
+group_members_table = get_dynamodb_table('GroupMembers')
+
+# One item per (group_id, user_id). Joins and leaves are single conditional writes and
+# the UserGroupsIndex answers "which groups is this user in" without a scan. The group
+# item keeps a member_count so fan-out decisions never need to read the member list.
+# Every join or leave bumps the user's membership_version so sync can detect it, and
+# the group's membership_version so cached member lists are reloaded.
+
+MEMBER_PAGE_SIZE = 500
+
+def bump_membership_versions(user_ids):
+    update_items_with_retry(users_table, [
+        {
+            'key': {'user_id': user_id},
+            'update_expression': 'ADD membership_version :one',
+            'expression_attribute_values': {':one': 1}
+        }
+        for user_id in user_ids
+    ])
+
+def add_group_members(group_id, user_ids):
+    batch_write_items_with_retry(group_members_table,
+                                 [{'group_id': group_id, 'user_id': user_id} for user_id in user_ids])
+    update_item_with_retry(groups_table, {'group_id': group_id},
+                           'ADD membership_version :one',
+                           {':one': 1})
+    bump_membership_versions(user_ids)
+
+def add_group_member(group_id, user_id):
+    # Returns False if the user is already a member
+    added = put_item_with_retry(group_members_table,
+                                {'group_id': group_id, 'user_id': user_id},
+                                condition_expression='attribute_not_exists(user_id)')
+    if added:
+        update_item_with_retry(groups_table, {'group_id': group_id},
+                               'ADD member_count :one, membership_version :one',
+                               {':one': 1})
+        bump_membership_versions([user_id])
+    return added
+
+def remove_group_member(group_id, user_id):
+    # Returns False if the user is not a member
+    removed = delete_item_with_retry(group_members_table,
+                                     {'group_id': group_id, 'user_id': user_id},
+                                     condition_expression='attribute_exists(user_id)')
+    if removed:
+        update_item_with_retry(groups_table, {'group_id': group_id},
+                               'ADD member_count :minus_one, membership_version :one',
+                               {':minus_one': -1, ':one': 1})
+        bump_membership_versions([user_id])
+    return removed
+
+def is_group_member(group_id, user_id):
+    response = get_item_with_retry(group_members_table, {'group_id': group_id, 'user_id': user_id}, projection=['user_id'])
+    return 'Item' in response
+
+def iter_group_member_pages(group_id, page_size=MEMBER_PAGE_SIZE, consistent_read=False):
+    # Yields lists of member IDs so fan-out can work through large groups in chunks
+    query_kwargs = {
+        'KeyConditionExpression': Key('group_id').eq(group_id),
+        'Limit': page_size,
+        'ConsistentRead': consistent_read
+    }
+    while True:
+        response = query_with_retry(group_members_table, **query_kwargs)
+        members = [item['user_id'] for item in response.get('Items', [])]
+        if members:
+            yield members
+        if 'LastEvaluatedKey' not in response:
+            return
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def get_user_groups(user_id):
+    items = query_all_with_retry(group_members_table,
+                                 IndexName='UserGroupsIndex',
+                                 KeyConditionExpression=Key('user_id').eq(user_id))
+    return [item['group_id'] for item in items]
@@ -0,0 +1,175 @@
+import heapq
+import os
+import time
+from itertools import islice
+from shared.dynamodb_client import get_dynamodb_table, get_item_with_retry, put_item_with_retry, update_item_with_retry, update_items_with_retry, query_with_retry, query_all_with_retry, query_page_with_retry
+from shared.inbox import key_range_condition, query_inbox, legacy_inbox_entries
+from shared.group_members import iter_group_member_pages
+from shared.message_ids import message_id_floor
+
+groups_table = get_dynamodb_table('Groups')
+users_table = get_dynamodb_table('Users')
+group_timeline_table = get_dynamodb_table('GroupTimeline')
+
+# Groups above this many members stop fanning out on write: each message is stored once
+# in the group's timeline and members merge that timeline into their inbox at read time.
+# The switch is sticky so messages already in the timeline stay visible if the group shrinks.
+# A member's Users item maps each timeline they read to a join bound, and only entries
+# with a greater sort key are theirs: a member who joins later does not see the messages
+# sent before they joined. Members subscribed when the group switches have an empty
+# bound, since the timeline only holds messages from after the switch.
+fanout_on_read_threshold = int(os.getenv('FANOUT_ON_READ_THRESHOLD', '100'))
+
+TIMELINE_FLAG_ATTRIBUTES = ['fanout_on_read', 'switching_to_fanout_on_read']
+
+def uses_fanout_on_read(group_item):
+    return group_item.get('fanout_on_read', False)
+
+def subscribes_members(group_item):
+    # Once a switch has begun, joins and leaves keep their own subscriptions in step
+    return uses_fanout_on_read(group_item) or group_item.get('switching_to_fanout_on_read', False)
+
+def read_timeline_flags(group_id):
+    # Consistent, so a join or leave written just before sees a switch that has begun
+    response = get_item_with_retry(groups_table, {'group_id': group_id}, projection=TIMELINE_FLAG_ATTRIBUTES, consistent_read=True)
+    return response.get('Item', {})
+
+def should_fanout_on_read(group_item):
+    return uses_fanout_on_read(group_item) or group_item.get('member_count', 0) > fanout_on_read_threshold
+
+def timeline_subscriptions(user_item):
+    # group_id -> join bound
+    return user_item.get('timeline_groups', {})
+
+def join_bound():
+    # Timeline entries minted from now on are visible to a member joining now
+    return message_id_floor(int(time.time() * 1000))
+
+def subscribe_to_timelines(user_ids, group_id, joined_at):
+    # Adds the group to each user's timeline_groups map, leaving an existing subscription
+    # and its bound alone, and creates the map for users who have none yet. Changing
+    # where a user's messages come from counts as a membership change for sync
+    pending = list(user_ids)
+    for _ in range(2):
+        added = update_items_with_retry(users_table, [
+            {
+                'key': {'user_id': user_id},
+                'update_expression': 'SET timeline_groups.#group_id = :joined_at ADD membership_version :one',
+                'expression_attribute_values': {':joined_at': joined_at, ':one': 1},
+                'expression_attribute_names': {'#group_id': group_id},
+                'condition_expression': 'attribute_exists(timeline_groups) AND attribute_not_exists(timeline_groups.#group_id)'
+            }
+            for user_id in pending
+        ])
+        pending = [user_id for user_id, was_added in zip(pending, added) if not was_added]
+        created = update_items_with_retry(users_table, [
+            {
+                'key': {'user_id': user_id},
+                'update_expression': 'SET timeline_groups = :groups ADD membership_version :one',
+                'expression_attribute_values': {':groups': {group_id: joined_at}, ':one': 1},
+                'condition_expression': 'attribute_not_exists(timeline_groups)'
+            }
+            for user_id in pending
+        ])
+        # The rest either were subscribed already or had the map created meanwhile
+        pending = [user_id for user_id, was_created in zip(pending, created) if not was_created]
+        if not pending:
+            return
+
+def subscribe_to_timeline(user_id, group_id):
+    subscribe_to_timelines([user_id], group_id, join_bound())
+
+def unsubscribe_from_timeline(user_id, group_id):
+    update_item_with_retry(users_table, {'user_id': user_id},
+                           'REMOVE timeline_groups.#group_id ADD membership_version :one',
+                           {':one': 1},
+                           expression_attribute_names={'#group_id': group_id},
+                           condition_expression='attribute_exists(timeline_groups.#group_id)')
+
+def switch_to_fanout_on_read(group_id):
+    # Marks the switch as begun, then subscribes members a page at a time, concurrently.
+    # Member pages are read consistently, so a join written before the mark is in them
+    # and one written after it subscribes itself. A second pass unsubscribes anyone who
+    # left after their page was read. The group is flagged last, so a failed switch is
+    # simply redone
+    update_item_with_retry(groups_table, {'group_id': group_id},
+                           'SET switching_to_fanout_on_read = :true',
+                           {':true': True})
+    subscribed = set()
+    for members in iter_group_member_pages(group_id, consistent_read=True):
+        subscribe_to_timelines(members, group_id, '')
+        subscribed.update(members)
+    for members in iter_group_member_pages(group_id, consistent_read=True):
+        subscribed.difference_update(members)
+    for user_id in subscribed:
+        unsubscribe_from_timeline(user_id, group_id)
+    update_item_with_retry(groups_table, {'group_id': group_id},
+                           'SET fanout_on_read = :true REMOVE switching_to_fanout_on_read',
+                           {':true': True})
+
+def add_to_timeline(group_id, message_id):
+    put_item_with_retry(group_timeline_table, {
+        'group_id': group_id,
+        'sort_key': message_id,
+        'message_id': message_id
+    })
+
+def advance_timeline_head(group_id, message_id):
+    # Lets sync tell whether a timeline has anything new without querying it
+    update_item_with_retry(groups_table, {'group_id': group_id},
+                           'SET last_message_id = :message_id',
+                           {':message_id': message_id},
+                           condition_expression='attribute_not_exists(last_message_id) OR last_message_id < :message_id')
+
+def visible_after(after, joined_at):
+    # The lower bound of what a member may read: their cursor or their join bound
+    return max(after or '', joined_at or '') or None
+
+def query_timeline(group_id, after=None, before=None, limit=None, newest_first=False, joined_at=None):
+    # Entries at or below joined_at are left out. The key condition takes a single bound,
+    # so with an upper bound those entries are dropped from the page instead
+    if not before:
+        after = visible_after(after, joined_at)
+    query_kwargs = {
+        'KeyConditionExpression': key_range_condition('group_id', group_id, after, before),
+        'ScanIndexForward': not newest_first
+    }
+    if limit:
+        entries = query_page_with_retry(group_timeline_table, limit, **query_kwargs)
+    else:
+        entries = query_all_with_retry(group_timeline_table, **query_kwargs)
+    if joined_at and before:
+        entries = [entry for entry in entries if entry['sort_key'] > joined_at]
+    return entries
+
+def count_timeline(group_id, cap, after=None, joined_at=None, exclude=frozenset()):
+    # Counts entries without returning them, less any whose sort key is in `exclude`, up
+    # to `cap`. Returns (count, whether there are more); a single page is read, however
+    # long the timeline
+    query_kwargs = {
+        'KeyConditionExpression': key_range_condition('group_id', group_id, visible_after(after, joined_at)),
+        'Limit': cap + len(exclude) + 1
+    }
+    if exclude:
+        query_kwargs['ProjectionExpression'] = 'sort_key'
+    else:
+        query_kwargs['Select'] = 'COUNT'
+    response = query_with_retry(group_timeline_table, **query_kwargs)
+    if exclude:
+        count = sum(1 for item in response['Items'] if item['sort_key'] not in exclude)
+    else:
+        count = response['Count']
+    return min(count, cap), count > cap or 'LastEvaluatedKey' in response
+
+def query_merged_inbox(user_item, after=None, before=None, limit=None, newest_first=False):
+    # Personal inbox plus the timelines of fan-out-on-read groups, merged in sort key order.
+    # Each source is read with the same bounds and limit, so a page never reads more than
+    # `limit` entries per source
+    user_id = user_item['user_id']
+    timelines = [query_inbox(user_id, after, before, limit, newest_first)]
+    if user_item.get('received_messages'):
+        timelines.append(legacy_inbox_entries(user_item, after, before, limit, newest_first))
+    for group_id, joined_at in timeline_subscriptions(user_item).items():
+        timelines.append(query_timeline(group_id, after, before, limit, newest_first, joined_at))
+    merged = heapq.merge(*timelines, key=lambda entry: entry['sort_key'], reverse=newest_first)
+    return list(islice(merged, limit)) if limit else list(merged)
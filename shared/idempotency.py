@@ -0,0 +1,103 @@
+import time
+from shared.dynamodb_client import get_dynamodb_table, put_item_with_retry, get_item_with_retry, update_item_with_retry, update_items_with_retry
+from shared.message_ids import derived_message_id
+
+processed_messages_table = get_dynamodb_table('ProcessedMessages')
+messages_table = get_dynamodb_table('Messages')
+
+# SQS delivers at least once, so a process handler may see the same record again, and a
+# client retrying send_message enqueues the same message twice. Each record claims its
+# idempotency key here before storing anything: the first claim fixes the message id,
+# later attempts reuse it so every write lands on the same keys, and once the message is
+# fully delivered the claim is marked done and further attempts are no-ops. An attempt
+# that wrote no inbox entry for some receivers records them as failed_receivers; one
+# that wrote no timeline entry records the group's timeline owner there instead. Claims
+# expire through the table's TTL after DEDUP_WINDOW_SECONDS.
+DEDUP_WINDOW_SECONDS = 24 * 3600
+# A pending claim older than the Lambda timeout belongs to an attempt that is gone
+PENDING_TIMEOUT_SECONDS = 60
+
+class ClaimInProgress(Exception):
+    # Another attempt at the same message is still running
+    pass
+
+def dedup_key(record, body):
+    # A client key is scoped to its sender; without one the SQS message id identifies
+    # the redeliveries of a record
+    if body.get('idempotency_key'):
+        return f"client#{body['sender_id']}#{body['idempotency_key']}"
+    return f"sqs#{record['messageId']}"
+
+def message_stored(message_id):
+    return 'Item' in get_item_with_retry(messages_table, {'message_id': message_id}, projection=['message_id'])
+
+def claim_message(record, body):
+    # Returns (dedup key, message id, already done, receivers), where receivers is None
+    # to deliver to everyone or the receivers an earlier attempt missed. Raises
+    # ClaimInProgress when a duplicate of this message is being processed elsewhere
+    key = dedup_key(record, body)
+    now = time.time()
+    message_id = derived_message_id(int(now * 1000), key)
+    claimed = put_item_with_retry(processed_messages_table, {
+        'dedup_key': key,
+        'message_id': message_id,
+        'record_id': record['messageId'],
+        'claimed_at': int(now),
+        'expires_at': int(now) + DEDUP_WINDOW_SECONDS
+    }, condition_expression='attribute_not_exists(dedup_key)')
+    if claimed:
+        return key, message_id, False, None
+
+    claim = get_item_with_retry(processed_messages_table, {'dedup_key': key}).get('Item')
+    if claim is None:
+        # Expired in between; nothing was stored under it within the window
+        return key, message_id, False, None
+    if claim.get('done'):
+        return key, claim['message_id'], True, None
+    if claim['record_id'] != record['messageId'] and now - int(claim['claimed_at']) < PENDING_TIMEOUT_SECONDS:
+        raise ClaimInProgress(f'{key} is being processed by another attempt')
+
+    # A redelivery of an attempt that did not finish. A stored message is delivered
+    # again under its own id, which rewrites the same keys. Otherwise the old id may
+    # already sort below the receivers' read cursors, so the attempt continues under the
+    # fresh one: nothing was stored, or only receivers without an entry are left
+    failed_receivers = claim.get('failed_receivers')
+    if not failed_receivers and message_stored(claim['message_id']):
+        return key, claim['message_id'], False, None
+    taken_over = update_item_with_retry(
+        processed_messages_table,
+        {'dedup_key': key},
+        'SET message_id = :message_id, record_id = :record_id, claimed_at = :claimed_at',
+        {':message_id': message_id, ':record_id': record['messageId'], ':claimed_at': int(now), ':previous': claim['message_id']},
+        condition_expression='message_id = :previous'
+    )
+    if not taken_over:
+        raise ClaimInProgress(f'{key} was taken over by another attempt')
+    return key, message_id, False, failed_receivers
+
+def record_failed_receivers(failures):
+    # failures maps dedup key -> receivers the attempt wrote no entry for, so the
+    # redelivery goes to them alone; an empty set means it replays to everyone
+    update_items_with_retry(processed_messages_table, [
+        {
+            'key': {'dedup_key': key},
+            'update_expression': 'SET failed_receivers = :receivers',
+            'expression_attribute_values': {':receivers': receivers}
+        } if receivers else {
+            'key': {'dedup_key': key},
+            'update_expression': 'REMOVE failed_receivers',
+            'expression_attribute_values': {}
+        }
+        for key, receivers in failures.items()
+    ])
+
+def complete_messages(keys):
+    # Marks the claims done once their messages are stored and delivered
+    update_items_with_retry(processed_messages_table, [
+        {
+            'key': {'dedup_key': key},
+            'update_expression': 'SET done = :done',
+            'expression_attribute_values': {':done': True}
+        }
+        for key in keys
+    ])
@@ -0,0 +1,74 @@
+from datetime import datetime, timezone
+from itertools import dropwhile
+from boto3.dynamodb.conditions import Key
+from shared.dynamodb_client import get_dynamodb_table, batch_get_items_with_retry, query_all_with_retry, query_page_with_retry
+from shared.message_ids import derived_message_id
+
+inbox_table = get_dynamodb_table('Inbox')
+users_table = get_dynamodb_table('Users')
+messages_table = get_dynamodb_table('Messages')
+
+# Users created before the Inbox table kept their deliveries in a received_messages list
+# on the Users item, with read flags on the messages themselves. Until migrate_inbox.py
+# has moved a user's list across, readers merge it in as entries keyed by each message's
+# timestamp, the same sort keys the migration writes.
+LEGACY_MESSAGE_ATTRIBUTES = ['message_id', 'timestamp', 'is_read']
+
+def bump_inbox_version(user_id, count=1):
+    # A single attempt, made on the fan_out pool; bumped once per batch of entries
+    # written for the user
+    users_table.meta.client.update_item(TableName=users_table.name,
+                                        Key={'user_id': user_id},
+                                        UpdateExpression='ADD inbox_version :count',
+                                        ExpressionAttributeValues={':count': count})
+
+def key_range_condition(partition_key, partition_value, after=None, before=None):
+    # Bounds are exclusive; `after` is used when both are given
+    key_condition = Key(partition_key).eq(partition_value)
+    if after:
+        key_condition = key_condition & Key('sort_key').gt(after)
+    elif before:
+        key_condition = key_condition & Key('sort_key').lt(before)
+    return key_condition
+
+def query_inbox(user_id, after=None, before=None, limit=None, newest_first=False):
+    # Entries come back in delivery order (reversed for newest_first); `limit` bounds the read
+    query_kwargs = {
+        'KeyConditionExpression': key_range_condition('user_id', user_id, after, before),
+        'ScanIndexForward': not newest_first
+    }
+    if limit:
+        return query_page_with_retry(inbox_table, limit, **query_kwargs)
+    return query_all_with_retry(inbox_table, **query_kwargs)
+
+def legacy_sort_key(message):
+    # Old message IDs are random UUIDs; the inbox key is derived from the stored timestamp
+    timestamp = datetime.fromisoformat(message['timestamp']).replace(tzinfo=timezone.utc)
+    return derived_message_id(int(timestamp.timestamp() * 1000), message['message_id'])
+
+def legacy_is_read(message, user_id):
+    # 1:1 messages carried a flag, group messages a flag per member
+    is_read = message.get('is_read', False)
+    return bool(is_read.get(user_id)) if isinstance(is_read, dict) else bool(is_read)
+
+def legacy_inbox_entries(user_item, after=None, before=None, limit=None, newest_first=False, unread_only=False):
+    # Same bounds and order as query_inbox, over the user's unmigrated received_messages.
+    # With unread_only, the messages before the oldest unread one are dropped, as the
+    # migration places the read cursor there
+    message_ids = user_item.get('received_messages')
+    if not message_ids:
+        return []
+    response = batch_get_items_with_retry(messages_table, [{'message_id': message_id} for message_id in message_ids],
+                                          projection=LEGACY_MESSAGE_ATTRIBUTES)
+    messages = sorted(response['Responses'][messages_table.name], key=legacy_sort_key)
+    if unread_only:
+        messages = list(dropwhile(lambda message: legacy_is_read(message, user_item['user_id']), messages))
+    entries = [{'user_id': user_item['user_id'], 'sort_key': legacy_sort_key(message), 'message_id': message['message_id']}
+               for message in messages]
+    if after:
+        entries = [entry for entry in entries if entry['sort_key'] > after]
+    elif before:
+        entries = [entry for entry in entries if entry['sort_key'] < before]
+    if newest_first:
+        entries.reverse()
+    return entries[:limit] if limit else entries
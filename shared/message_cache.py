@@ -0,0 +1,63 @@
+import json
+from shared.redis_client import get_redis_client
+
+# Read-through cache for message items. Messages never change once written, so a cached
+# copy stays valid until it expires. Lookups are one pipelined round of MGETs; misses
+# are loaded from DynamoDB and written back with a TTL. Redis is expected to run with an
+# LRU maxmemory policy, and oversized messages are not cached at all, so the cache stays
+# within its memory budget. Without REDIS_URL every lookup goes to DynamoDB.
+
+MESSAGE_CACHE_TTL_SECONDS = 3600
+MAX_CACHED_MESSAGE_BYTES = 4096
+MGET_CHUNK_SIZE = 100
+
+# Running totals for the warm container, logged with each lookup
+cache_stats = {'hits': 0, 'misses': 0}
+
+def message_cache_key(message_id):
+    return f'message:{message_id}'
+
+def get_cached_messages(redis_client, message_ids):
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        for i in range(0, len(message_ids), MGET_CHUNK_SIZE):
+            pipeline.mget([message_cache_key(message_id) for message_id in message_ids[i:i + MGET_CHUNK_SIZE]])
+        values = [value for chunk in pipeline.execute() for value in chunk]
+    except Exception as e:
+        print(f"Error reading messages from Redis: {e}")
+        return {}
+    return {message_id: json.loads(value) for message_id, value in zip(message_ids, values) if value}
+
+def cache_messages(messages):
+    redis_client = get_redis_client()
+    if not redis_client or not messages:
+        return
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        for message in messages:
+            value = json.dumps(message)
+            if len(value) <= MAX_CACHED_MESSAGE_BYTES:
+                pipeline.set(message_cache_key(message['message_id']), value, ex=MESSAGE_CACHE_TTL_SECONDS)
+        pipeline.execute()
+    except Exception as e:
+        print(f"Error caching messages in Redis: {e}")
+
+def get_messages_read_through(message_ids, load_messages):
+    # load_messages takes the ids that missed and returns their items keyed by id
+    message_ids = list(dict.fromkeys(message_ids))
+    redis_client = get_redis_client()
+    if not redis_client:
+        return load_messages(message_ids)
+
+    messages_by_id = get_cached_messages(redis_client, message_ids)
+    missing = [message_id for message_id in message_ids if message_id not in messages_by_id]
+    if missing:
+        loaded = load_messages(missing)
+        cache_messages(list(loaded.values()))
+        messages_by_id.update(loaded)
+
+    cache_stats['hits'] += len(message_ids) - len(missing)
+    cache_stats['misses'] += len(missing)
+    print(f"Message cache: {len(message_ids) - len(missing)} hits, {len(missing)} misses "
+          f"({cache_stats['hits']} hits, {cache_stats['misses']} misses in this container)")
+    return messages_by_id
@@ -0,0 +1,43 @@
+import hashlib
+from datetime import datetime
+
+# Message IDs are ULIDs: a 48-bit millisecond timestamp followed by 80 random bits,
+# Crockford base32 encoded to 26 characters. They sort lexicographically in creation
+# order to the millisecond, so the ID doubles as the inbox and timeline sort key. The
+# random part is derived from the message's idempotency key, so IDs within one
+# millisecond are not ordered among themselves.
+
+CROCKFORD_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+RANDOM_BITS = 80
+MESSAGE_ID_LENGTH = 26
+
+def encode_crockford(value, length):
+    chars = []
+    for _ in range(length):
+        chars.append(CROCKFORD_ALPHABET[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+def decode_crockford(text):
+    value = 0
+    for char in text:
+        value = (value << 5) | CROCKFORD_ALPHABET.index(char)
+    return value
+
+def derived_message_id(timestamp_ms, seed):
+    # Deterministic ID for an operation that may be retried: the random part is taken
+    # from a hash of its idempotency key, so every attempt at that millisecond agrees
+    random_part = int.from_bytes(hashlib.sha256(seed.encode()).digest()[:10], 'big')
+    return encode_crockford((timestamp_ms << RANDOM_BITS) | random_part, MESSAGE_ID_LENGTH)
+
+def message_id_floor(timestamp_ms):
+    # Lowest ID of that millisecond: every ID minted from then on sorts above it
+    return encode_crockford(timestamp_ms << RANDOM_BITS, MESSAGE_ID_LENGTH)
+
+def message_id_millis(message_id):
+    # Millisecond timestamp encoded in the ID
+    return decode_crockford(message_id[:10])
+
+def message_id_timestamp(message_id):
+    # ISO timestamp of the millisecond encoded in the ID
+    return datetime.utcfromtimestamp(message_id_millis(message_id) / 1000).isoformat()
@@ -0,0 +1,28 @@
+from shared.dynamodb_client import get_dynamodb_table, batch_get_items_with_retry
+from shared.message_cache import get_messages_read_through
+
+messages_table = get_dynamodb_table('Messages')
+
+# Only the attributes a response renders are fetched
+MESSAGE_ATTRIBUTES = ['message_id', 'message', 'sender_id', 'timestamp', 'group_id']
+
+def load_messages(message_ids):
+    message_keys = [{'message_id': message_id} for message_id in message_ids]
+    response = batch_get_items_with_retry(messages_table, message_keys, projection=MESSAGE_ATTRIBUTES)
+    return {message['message_id']: message for message in response.get('Responses', {}).get('Messages', [])}
+
+def fetch_messages(inbox_entries):
+    # Message items in inbox order; BatchGetItem itself returns them unordered
+    messages_by_id = get_messages_read_through([entry['message_id'] for entry in inbox_entries], load_messages)
+    return [messages_by_id[entry['message_id']] for entry in inbox_entries if entry['message_id'] in messages_by_id]
+
+def format_message(message):
+    formatted_message = {
+        'message': message['message'],
+        'sender_id': message['sender_id'],
+        'timestamp': message['timestamp']
+    }
+    if 'group_id' in message:
+        formatted_message['received_from'] = message['sender_id']
+        formatted_message['group_id'] = message['group_id']
+    return formatted_message
@@ -0,0 +1,57 @@
+import time
+from shared.redis_client import get_redis_client
+
+# Long-poll wake-ups. The process handlers publish on a per-user channel after an inbox
+# delivery, or on a per-group channel after a fan-out-on-read timeline append, and a
+# parked get_new_messages request subscribes to its own channel plus those of its
+# timeline groups. Without Redis nothing is published and requests never park.
+
+MAX_WAIT_SECONDS = 20
+
+def user_channel(user_id):
+    return f'new-messages:user:{user_id}'
+
+def group_channel(group_id):
+    return f'new-messages:group:{group_id}'
+
+def publish_wakeups(channels):
+    redis_client = get_redis_client()
+    if not redis_client or not channels:
+        return
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        for channel in set(channels):
+            pipeline.publish(channel, '1')
+        pipeline.execute()
+    except Exception as e:
+        # A lost wake-up only delays delivery until the waiter times out
+        print(f"Error publishing wake-ups to Redis: {e}")
+
+def subscribe_to_new_messages(user_item):
+    # Returns an open subscription, or None when long-polling is unavailable
+    redis_client = get_redis_client()
+    if not redis_client:
+        return None
+    channels = [user_channel(user_item['user_id'])]
+    channels.extend(group_channel(group_id) for group_id in user_item.get('timeline_groups', {}))
+    try:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(*channels)
+        return pubsub
+    except Exception as e:
+        print(f"Error subscribing to Redis: {e}")
+        return None
+
+def wait_for_new_messages(pubsub, timeout):
+    # True once a wake-up arrives, False when the timeout runs out
+    deadline = time.time() + min(timeout, MAX_WAIT_SECONDS)
+    try:
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            if pubsub.get_message(timeout=min(remaining, 1)):
+                return True
+    except Exception as e:
+        print(f"Error waiting on Redis: {e}")
+        return False
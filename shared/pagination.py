@@ -0,0 +1,35 @@
+import base64
+import json
+
+# Page cursors and sync tokens are opaque to clients: URL-safe base64 of a small JSON
+# payload. Page cursors carry the last sort key returned and the order they were issued
+# for, so a cursor cannot be replayed in the other direction.
+
+ORDER_OLDEST = 'oldest'
+ORDER_NEWEST = 'newest'
+ORDERS = (ORDER_OLDEST, ORDER_NEWEST)
+
+def encode_opaque_token(payload):
+    encoded = json.dumps(payload, separators=(',', ':'))
+    return base64.urlsafe_b64encode(encoded.encode()).decode().rstrip('=')
+
+def decode_opaque_token(token):
+    # Raises ValueError for anything that is not a token we issued
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError as e:
+        raise ValueError('Malformed token') from e
+    if not isinstance(payload, dict):
+        raise ValueError('Malformed token')
+    return payload
+
+def encode_page_cursor(sort_key, order):
+    return encode_opaque_token({'k': sort_key, 'o': order})
+
+def decode_page_cursor(cursor, order):
+    # Raises ValueError for malformed cursors and cursors issued for the other order
+    payload = decode_opaque_token(cursor)
+    sort_key = payload.get('k')
+    if payload.get('o') != order or not isinstance(sort_key, str):
+        raise ValueError('Cursor does not match the requested order')
+    return sort_key
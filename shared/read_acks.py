@@ -0,0 +1,59 @@
+import json
+import os
+import uuid
+import boto3
+from shared.read_state import build_read_ack, apply_read_ack, advance_read_cursor
+
+# A fetch advances the user's own read cursor before it returns, so the next fetch or
+# long-poll starts after what it returned. The rest of marking it as read, clearing the
+# unread counters, is taken off the request path: the get handlers enqueue one compact
+# ack and the process_read_ack consumer coalesces acks per user across an SQS batch.
+
+class SqsAckQueue:
+    def __init__(self, queue_url):
+        self.queue_url = queue_url
+        self.sqs = boto3.client('sqs')
+
+    def send(self, read_ack):
+        self.sqs.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(read_ack))
+
+class LocalAckQueue:
+    # In-memory stand-in for offline load tests; drain() yields SQS-shaped events
+    # that can be passed straight to the consumer handler
+    def __init__(self):
+        self.bodies = []
+
+    def send(self, read_ack):
+        self.bodies.append(json.dumps(read_ack))
+
+    def drain(self, batch_size=10):
+        while self.bodies:
+            batch, self.bodies = self.bodies[:batch_size], self.bodies[batch_size:]
+            yield {'Records': [{'messageId': str(uuid.uuid4()), 'body': body} for body in batch]}
+
+ack_queue_url = os.getenv('ACK_QUEUE_URL')
+ack_queue = SqsAckQueue(ack_queue_url) if ack_queue_url else None
+
+def acknowledge_read(user_item, inbox_entries, messages):
+    advance_read_cursor(user_item, [entry['sort_key'] for entry in inbox_entries])
+    read_ack = build_read_ack(user_item['user_id'], inbox_entries, messages)
+    if not read_ack['conversations']:
+        return
+    if ack_queue is None:
+        # No queue configured: apply the ack inline
+        apply_read_ack(read_ack)
+    else:
+        ack_queue.send(read_ack)
+
+def coalesce_read_acks(read_acks):
+    coalesced = {}
+    for read_ack in read_acks:
+        current = coalesced.setdefault(read_ack['user_id'], {
+            'user_id': read_ack['user_id'],
+            'conversations': {}
+        })
+        # Per conversation the furthest cursor and every id read
+        for conversation_id, (read_up_to, message_ids) in read_ack.get('conversations', {}).items():
+            current_read_up_to, current_message_ids = current['conversations'].get(conversation_id, ('', []))
+            current['conversations'][conversation_id] = [max(current_read_up_to, read_up_to), sorted(set(current_message_ids) | set(message_ids))]
+    return list(coalesced.values())
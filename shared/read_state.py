@@ -0,0 +1,89 @@
+import time
+from shared.dynamodb_client import get_dynamodb_table, update_item_with_retry
+from shared.message_ids import message_id_floor
+from shared.unread_counts import message_conversation, clear_unread
+
+users_table = get_dynamodb_table('Users')
+
+# Read state is a single high-water mark per user: an inbox sort key below which the
+# user has fetched every message. Inbox entries are time-ordered, so an entry is new
+# exactly when its sort key is greater than the cursor, for 1:1 and group messages alike.
+#
+# A message id is minted when the message is processed, but its entry only becomes
+# visible once delivery finishes, and a slow or concurrent delivery can land after a
+# newer entry was already read. So the cursor trails real time by READ_SETTLE_SECONDS
+# (longer than a process handler may run) and never passes an id that could still
+# arrive below it. Entries read above the cursor are kept in the user's read_ids set,
+# which readers skip, until the cursor passes them.
+
+READ_SETTLE_SECONDS = 70
+MAX_READ_IDS = 500
+
+def get_read_cursor(user_item):
+    return user_item.get('read_up_to')
+
+def get_read_ids(user_item):
+    return user_item.get('read_ids', set())
+
+def read_position(user_item):
+    # Sort key of the newest entry read, at or above the cursor
+    return max(get_read_ids(user_item), default=get_read_cursor(user_item))
+
+def skip_read_entries(user_item, entries):
+    # Drops entries above the cursor that were already read
+    read_ids = get_read_ids(user_item)
+    return [entry for entry in entries if entry['sort_key'] not in read_ids] if read_ids else entries
+
+def advance_read_cursor(user_item, sort_keys):
+    # One write per fetch of the given sort keys. The cursor moves up to the newest key
+    # read but no further than the settle margin; keys above it go into read_ids. The
+    # write is conditional on the cursor it started from, and a fetch that loses a race
+    # only adds its keys
+    previous = get_read_cursor(user_item)
+    settled = message_id_floor(int((time.time() - READ_SETTLE_SECONDS) * 1000))
+    cursor = max(previous or '', min(max(sort_keys), settled))
+    read_ids = sorted(key for key in get_read_ids(user_item) | set(sort_keys) if key > cursor)
+    if len(read_ids) > MAX_READ_IDS:
+        # Too many to track: the oldest give up their margin
+        cursor = read_ids[-MAX_READ_IDS - 1]
+        read_ids = read_ids[-MAX_READ_IDS:]
+
+    values = {':cursor': cursor}
+    if read_ids:
+        update_expression = 'SET read_up_to = :cursor, read_ids = :read_ids'
+        values[':read_ids'] = set(read_ids)
+    else:
+        update_expression = 'SET read_up_to = :cursor REMOVE read_ids'
+    if previous is None:
+        condition_expression = 'attribute_not_exists(read_up_to)'
+    else:
+        condition_expression = 'read_up_to = :previous'
+        values[':previous'] = previous
+    key = {'user_id': user_item['user_id']}
+    if update_item_with_retry(users_table, key, update_expression, values, condition_expression=condition_expression):
+        return
+    unread_keys = {sort_key for sort_key in sort_keys if sort_key > cursor}
+    if unread_keys:
+        update_item_with_retry(users_table, key, 'ADD read_ids :read_ids', {':read_ids': unread_keys})
+
+def build_read_ack(user_id, inbox_entries, messages):
+    # Compact record of what a fetch read: per conversation the cursor and the ids of the
+    # inbox messages read, for the unread counters
+    sort_keys = {entry['message_id']: entry['sort_key'] for entry in inbox_entries}
+    # Timeline entries are keyed by group; only personal inbox deliveries are counted
+    inbox_message_ids = {entry['message_id'] for entry in inbox_entries if 'user_id' in entry}
+    conversations = {}
+    for message in messages:
+        sort_key = sort_keys[message['message_id']]
+        if message['message_id'] in inbox_message_ids:
+            conversation_id = message_conversation(message)
+            read_up_to, message_ids = conversations.setdefault(conversation_id, ['', []])
+            conversations[conversation_id] = [max(read_up_to, sort_key), message_ids + [message['message_id']]]
+    return {
+        'user_id': user_id,
+        'conversations': conversations
+    }
+
+def apply_read_ack(read_ack):
+    # Unread counters; the user's own cursor is advanced by the fetch
+    clear_unread(read_ack['user_id'], read_ack.get('conversations', {}))
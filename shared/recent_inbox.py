@@ -0,0 +1,114 @@
+import heapq
+from shared.inbox import query_inbox, legacy_inbox_entries
+from shared.group_timeline import query_timeline, timeline_subscriptions
+from shared.message_ids import message_id_millis
+from shared.redis_client import get_redis_client
+from shared.read_state import skip_read_entries
+
+# Recent-inbox tier. Alongside each inbox or timeline append, the process handlers add
+# the message id to a capped Redis sorted set for that inbox or timeline, scored by the
+# millisecond in the id. Each set also holds a FLOOR_MEMBER whose score is a coverage
+# bound: the set contains every entry from a later millisecond. The floor starts at the
+# first message a new (or evicted) set sees and rises as old entries are trimmed, so a
+# reader whose cursor is past the floor can be answered from Redis alone; anything else
+# falls back to DynamoDB for that source.
+
+RECENT_INBOX_SIZE = 200
+RECENT_INBOX_TTL_SECONDS = 7 * 86400
+FLOOR_MEMBER = 'floor'
+
+# KEYS[1] = set; ARGV = score, message id, size, ttl. The floor is added only if missing
+# and is not counted towards the size
+RECORD_RECENT_SCRIPT = """
+redis.call('ZADD', KEYS[1], 'NX', ARGV[1], ARGV[5])
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+local excess = redis.call('ZCARD', KEYS[1]) - 1 - tonumber(ARGV[3])
+if excess > 0 then
+    local floor = tonumber(redis.call('ZSCORE', KEYS[1], ARGV[5]))
+    redis.call('ZREM', KEYS[1], ARGV[5])
+    local trimmed = redis.call('ZRANGE', KEYS[1], excess - 1, excess - 1, 'WITHSCORES')
+    redis.call('ZREMRANGEBYRANK', KEYS[1], 0, excess - 1)
+    redis.call('ZADD', KEYS[1], math.max(floor, tonumber(trimmed[2])), ARGV[5])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+"""
+
+record_recent_script = None
+
+def recent_inbox_key(user_id):
+    return f'recent-inbox:{user_id}'
+
+def recent_timeline_key(group_id):
+    return f'recent-timeline:{group_id}'
+
+def record_recent(entries):
+    # entries is a list of (set key, message id); all of them go in one pipeline
+    global record_recent_script
+    redis_client = get_redis_client()
+    if not redis_client or not entries:
+        return
+    if record_recent_script is None:
+        record_recent_script = redis_client.register_script(RECORD_RECENT_SCRIPT)
+    keys = list(dict.fromkeys(key for key, _ in entries))
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        for key, message_id in entries:
+            args = [message_id_millis(message_id), message_id, RECENT_INBOX_SIZE, RECENT_INBOX_TTL_SECONDS, FLOOR_MEMBER]
+            record_recent_script(keys=[key], args=args, client=pipeline)
+        pipeline.execute()
+    except Exception as e:
+        print(f"Error recording recent messages in Redis: {e}")
+        # A set that missed an entry must not be trusted, so drop it
+        try:
+            redis_client.delete(*keys)
+        except Exception as e:
+            print(f"Error dropping recent message sets in Redis: {e}")
+
+def get_recent_entries(redis_client, keys, after):
+    # Ids after the cursor for each key, or None for keys that do not cover it
+    after_millis = message_id_millis(after)
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.zscore(key, FLOOR_MEMBER)
+            pipeline.zrangebyscore(key, after_millis, '+inf')
+        results = pipeline.execute()
+    except Exception as e:
+        print(f"Error reading recent messages from Redis: {e}")
+        return [None] * len(keys)
+
+    recent = []
+    for floor, members in zip(results[0::2], results[1::2]):
+        if floor is None or after_millis <= floor:
+            recent.append(None)
+        else:
+            recent.append([member for member in members if member != FLOOR_MEMBER and member > after])
+    return recent
+
+def query_new_entries(user_item, after):
+    # Same entries as query_merged_inbox(user_item, after=after), less those already read
+    # above the cursor, served from the recent sets where they cover the cursor
+    user_id = user_item['user_id']
+    subscriptions = timeline_subscriptions(user_item)
+    group_ids = sorted(subscriptions)
+    keys = [recent_inbox_key(user_id)] + [recent_timeline_key(group_id) for group_id in group_ids]
+
+    redis_client = get_redis_client()
+    recent = get_recent_entries(redis_client, keys, after) if redis_client and after else [None] * len(keys)
+
+    sources = []
+    if recent[0] is None:
+        sources.append(query_inbox(user_id, after))
+    else:
+        sources.append([{'user_id': user_id, 'sort_key': message_id, 'message_id': message_id} for message_id in recent[0]])
+    if user_item.get('received_messages'):
+        # Without a cursor yet, the old read flags say where reading stopped
+        sources.append(legacy_inbox_entries(user_item, after, unread_only=not after))
+    for group_id, message_ids in zip(group_ids, recent[1:]):
+        joined_at = subscriptions[group_id]
+        if message_ids is None:
+            sources.append(query_timeline(group_id, after, joined_at=joined_at))
+        else:
+            sources.append([{'group_id': group_id, 'sort_key': message_id, 'message_id': message_id}
+                            for message_id in message_ids if message_id > joined_at])
+    return skip_read_entries(user_item, list(heapq.merge(*sources, key=lambda entry: entry['sort_key'])))
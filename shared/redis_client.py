@@ -0,0 +1,16 @@
+import os
+import redis
+
+# Redis is an optional cache tier: without REDIS_URL every helper built on it
+# falls straight through to DynamoDB
+redis_url = os.getenv('REDIS_URL')
+
+redis_client = None
+
+def get_redis_client():
+    global redis_client
+    if not redis_url:
+        return None
+    if redis_client is None:
+        redis_client = redis.Redis.from_url(redis_url, decode_responses=True, socket_timeout=1, socket_connect_timeout=1)
+    return redis_client
@@ -0,0 +1,199 @@
+import re
+import zlib
+from boto3.dynamodb.conditions import Key
+from shared.dynamodb_client import get_dynamodb_table, get_item_with_retry, put_item_with_retry, update_item_with_retry, update_items_with_retry, query_with_retry
+from shared.message_ids import RANDOM_BITS, MESSAGE_ID_LENGTH, encode_crockford, decode_crockford
+
+search_index_table = get_dynamodb_table('SearchIndex')
+
+# Inverted index from term to message ids, partitioned by owner: a user for messages
+# delivered to their inbox, or a fan-out-on-read group for its timeline. Each term's
+# postings are spread over items keyed '<term>#...' in the owner's partition, so an
+# exact term is a begins_with('<term>#') query and a prefix is a begins_with('<prefix>')
+# query. Writers ADD new ids to the term's open block, a string set, which is idempotent
+# and needs no read. Now and then a writer seals the open block into a packed block
+# (delta-encoded timestamps plus the raw random bits, under half the size of the ids).
+#
+# A sealed block is keyed by its newest id and the open block sorts above all of them,
+# so reading a term's blocks in descending key order goes newest first: every id not
+# read yet is at or below the key of the last block read. Searches read a few blocks at
+# a time from whichever term is furthest behind and stop once a page of matches is
+# known to be the newest.
+
+OPEN_BLOCK_SUFFIX = '#~'
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+MAX_TERMS_PER_MESSAGE = 100
+# Roughly one write in this many per term tries to seal the open block
+COMPACT_EVERY = 64
+MIN_SEALED_BLOCK_SIZE = 16
+BLOCKS_PER_QUERY = 8
+# A prefix is expanded to at most this many distinct terms per owner
+MAX_PREFIX_TERMS = 100
+# Above every posting key in UTF-8 byte order
+KEY_UPPER_BOUND = '\U0010ffff'
+RANDOM_BYTES = RANDOM_BITS // 8
+
+TERM_PATTERN = re.compile(r'\w+')
+
+def group_owner(group_id):
+    return f'group#{group_id}'
+
+def tokenize(text):
+    terms = [term for term in TERM_PATTERN.findall(text.lower()) if MIN_TERM_LENGTH <= len(term) <= MAX_TERM_LENGTH]
+    return list(dict.fromkeys(terms))[:MAX_TERMS_PER_MESSAGE]
+
+def open_block_key(term):
+    return term + OPEN_BLOCK_SUFFIX
+
+def pack_postings(message_ids):
+    packed = bytearray()
+    previous_millis = 0
+    for message_id in sorted(message_ids):
+        value = decode_crockford(message_id)
+        millis = value >> RANDOM_BITS
+        delta = millis - previous_millis
+        while delta >= 0x80:
+            packed.append((delta & 0x7f) | 0x80)
+            delta >>= 7
+        packed.append(delta)
+        packed += (value & ((1 << RANDOM_BITS) - 1)).to_bytes(RANDOM_BYTES, 'big')
+        previous_millis = millis
+    return bytes(packed)
+
+def unpack_postings(packed):
+    message_ids = []
+    millis = 0
+    position = 0
+    while position < len(packed):
+        delta = shift = 0
+        while True:
+            byte = packed[position]
+            position += 1
+            delta |= (byte & 0x7f) << shift
+            shift += 7
+            if byte < 0x80:
+                break
+        millis += delta
+        random_part = int.from_bytes(packed[position:position + RANDOM_BYTES], 'big')
+        position += RANDOM_BYTES
+        message_ids.append(encode_crockford((millis << RANDOM_BITS) | random_part, MESSAGE_ID_LENGTH))
+    return message_ids
+
+def should_compact(term, message_id):
+    return zlib.crc32(f'{term}:{message_id}'.encode()) % COMPACT_EVERY == 0
+
+def compact_postings(owner_id, term):
+    key = {'owner_id': owner_id, 'posting_key': open_block_key(term)}
+    response = get_item_with_retry(search_index_table, key, projection=['message_ids'])
+    message_ids = sorted(response.get('Item', {}).get('message_ids', set()))
+    if len(message_ids) < MIN_SEALED_BLOCK_SIZE:
+        return
+    # A concurrent compaction of the same ids loses the conditional put and leaves the
+    # open block alone; ids added meanwhile stay behind for the next compaction
+    sealed = put_item_with_retry(search_index_table, {
+        'owner_id': owner_id,
+        'posting_key': f'{term}#{message_ids[-1]}',
+        'postings': pack_postings(message_ids),
+        'posting_count': len(message_ids)
+    }, condition_expression='attribute_not_exists(posting_key)')
+    if sealed:
+        update_item_with_retry(search_index_table, key, 'DELETE message_ids :message_ids', {':message_ids': set(message_ids)})
+
+def index_messages(messages):
+    # messages is a list of (owner ids, message id, text). Ids for the same owner and
+    # term are added in one write
+    postings = {}
+    for owner_ids, message_id, text in messages:
+        for term in tokenize(text):
+            for owner_id in owner_ids:
+                postings.setdefault((owner_id, term), set()).add(message_id)
+    update_items_with_retry(search_index_table, [
+        {
+            'key': {'owner_id': owner_id, 'posting_key': open_block_key(term)},
+            'update_expression': 'ADD message_ids :message_ids',
+            'expression_attribute_values': {':message_ids': message_ids}
+        }
+        for (owner_id, term), message_ids in postings.items()
+    ])
+    for (owner_id, term), message_ids in postings.items():
+        if any(should_compact(term, message_id) for message_id in message_ids):
+            compact_postings(owner_id, term)
+
+def index_message(owner_ids, message_id, text):
+    index_messages([(owner_ids, message_id, text)])
+
+class PostingStream:
+    # One term's postings in one owner's partition, newest blocks first. bound is at or
+    # above every visible id not read yet, and '' once nothing visible is left
+    def __init__(self, owner_id, term, joined_at='', before=None):
+        self.owner_id = owner_id
+        self.term = term
+        self.joined_at = joined_at
+        self.before = before
+        self.bound = OPEN_BLOCK_SUFFIX[1:]
+        self.start_key = None
+
+    def read(self):
+        query_kwargs = {}
+        if self.start_key:
+            query_kwargs['ExclusiveStartKey'] = self.start_key
+        response = query_with_retry(search_index_table,
+                                    KeyConditionExpression=Key('owner_id').eq(self.owner_id) & Key('posting_key').begins_with(self.term + '#'),
+                                    ProjectionExpression='posting_key, message_ids, postings',
+                                    ScanIndexForward=False,
+                                    Limit=BLOCKS_PER_QUERY,
+                                    **query_kwargs)
+        items = response.get('Items', [])
+        message_ids = set()
+        for item in items:
+            message_ids.update(item.get('message_ids', set()))
+            if 'postings' in item:
+                message_ids.update(unpack_postings(item['postings'].value))
+        self.start_key = response.get('LastEvaluatedKey')
+        self.bound = items[-1]['posting_key'][len(self.term) + 1:] if self.start_key and items else ''
+        if self.bound <= self.joined_at:
+            self.bound = ''
+        return {message_id for message_id in message_ids
+                if message_id > self.joined_at and (self.before is None or message_id < self.before)}
+
+def prefix_terms(owner_id, prefix):
+    # Distinct terms starting with the prefix, one single-item query per term
+    terms = []
+    lower = prefix
+    while len(terms) < MAX_PREFIX_TERMS:
+        items = query_with_retry(search_index_table,
+                                 KeyConditionExpression=Key('owner_id').eq(owner_id) & Key('posting_key').between(lower, prefix + KEY_UPPER_BOUND),
+                                 ProjectionExpression='posting_key',
+                                 Limit=1).get('Items', [])
+        if not items:
+            break
+        term = items[0]['posting_key'].split('#', 1)[0]
+        terms.append(term)
+        # '$' follows '#', so the next query starts past every block of this term
+        lower = term + '$'
+    return terms
+
+def search_postings(terms, owners, limit, before=None):
+    # terms is a list of (term, prefix) and owners a list of (owner id, joined_at).
+    # Returns the newest `limit` message ids below `before` that match every term
+    term_streams = [
+        [
+            PostingStream(owner_id, expanded, joined_at, before)
+            for owner_id, joined_at in owners
+            for expanded in (prefix_terms(owner_id, term) if prefix else [term])
+        ]
+        for term, prefix in terms
+    ]
+    seen = [set() for _ in terms]
+    while True:
+        bound = max((stream.bound for streams in term_streams for stream in streams), default='')
+        # A term whose streams are all read has no matches below its oldest id
+        floor = max((min(seen[index], default=OPEN_BLOCK_SUFFIX[1:])
+                     for index, streams in enumerate(term_streams) if not any(stream.bound for stream in streams)), default='')
+        matches = [message_id for message_id in set.intersection(*seen) if message_id > bound]
+        if not bound or bound < floor or len(matches) >= limit:
+            return sorted(matches, reverse=True)[:limit]
+        index, stream = max(((index, stream) for index, streams in enumerate(term_streams) for stream in streams),
+                            key=lambda entry: entry[1].bound)
+        seen[index].update(stream.read())
@@ -0,0 +1,109 @@
+from boto3.dynamodb.conditions import Key
+from shared.dynamodb_client import get_dynamodb_table, update_items_with_retry, query_all_with_retry
+
+unread_counts_table = get_dynamodb_table('UnreadCounts')
+
+# One counter item per (user, conversation), where a conversation is either the sender
+# of 1:1 messages or a group. The counter holds the ids of the unread messages rather
+# than a number: delivery ADDs ids to unread_ids and a read ack DELETEs the ids it read,
+# so a redelivered message or a replayed ack changes nothing. Only MAX_TRACKED_UNREAD
+# ids are kept, since every write is billed on the item's size; a delivery past that
+# sets the unread_overflow flag, and the count is reported as at least the ids tracked.
+# A conversation read up to its newest message (last_message_id) is reset outright.
+# Fan-out-on-read groups keep no per-member counters, their unread messages are counted
+# from the timeline instead, up to the same cap.
+
+MAX_TRACKED_UNREAD = 30
+
+TRACKED_CONDITION = 'attribute_not_exists(unread_ids) OR size(unread_ids) < :cap'
+NEWER_CONDITION = 'attribute_not_exists(last_message_id) OR last_message_id < :message_id'
+
+def direct_conversation(sender_id):
+    return f'user#{sender_id}'
+
+def group_conversation(group_id):
+    return f'group#{group_id}'
+
+def message_conversation(message):
+    if message.get('group_id'):
+        return group_conversation(message['group_id'])
+    return direct_conversation(message['sender_id'])
+
+def unread_update(user_id, conversation_id, message_ids, tracked, newer):
+    values = {}
+    assignments = []
+    conditions = []
+    if tracked:
+        values[':message_ids'] = message_ids
+        values[':cap'] = MAX_TRACKED_UNREAD
+        conditions.append(f'({TRACKED_CONDITION})')
+    else:
+        # A flag rather than a count, so a redelivery cannot count a message twice
+        assignments.append('unread_overflow = :true')
+        values[':true'] = True
+    if newer:
+        assignments.append('last_message_id = :message_id')
+        values[':message_id'] = max(message_ids)
+        conditions.append(f'({NEWER_CONDITION})')
+    update_expression = ' '.join(
+        (['ADD unread_ids :message_ids'] if tracked else []) + ([f"SET {', '.join(assignments)}"] if assignments else [])
+    )
+    update = {
+        'key': {'user_id': user_id, 'conversation_id': conversation_id},
+        'update_expression': update_expression,
+        'expression_attribute_values': values
+    }
+    if conditions:
+        update['condition_expression'] = ' AND '.join(conditions)
+    return update
+
+def record_unread(counters):
+    # counters maps (user_id, conversation_id) -> set of message ids delivered, so a burst
+    # into one conversation is a single write. A counter that is full, or already saw a
+    # newer message, falls through to the next variant: tracked and newest, tracked,
+    # overflow and newest, overflow
+    pending = list(counters)
+    for tracked, newer in ((True, True), (True, False), (False, True), (False, False)):
+        if not pending:
+            return
+        updated = update_items_with_retry(unread_counts_table, [
+            unread_update(user_id, conversation_id, counters[(user_id, conversation_id)], tracked, newer)
+            for user_id, conversation_id in pending
+        ])
+        pending = [counter for counter, was_updated in zip(pending, updated) if not was_updated]
+
+def clear_unread(user_id, conversations):
+    # conversations maps conversation_id -> [read_up_to, message ids read]. A conversation
+    # read up to its newest message is reset; otherwise the ids read are deleted from it.
+    # Both are idempotent, so acks can be coalesced and redelivered freely
+    conversation_ids = list(conversations)
+    key = lambda conversation_id: {'user_id': user_id, 'conversation_id': conversation_id}
+    cleared = update_items_with_retry(unread_counts_table, [
+        {
+            'key': key(conversation_id),
+            'update_expression': 'REMOVE unread_ids, unread_overflow',
+            'expression_attribute_values': {':cursor': conversations[conversation_id][0]},
+            'condition_expression': 'last_message_id <= :cursor'
+        }
+        for conversation_id in conversation_ids
+    ])
+    update_items_with_retry(unread_counts_table, [
+        {
+            'key': key(conversation_id),
+            'update_expression': 'DELETE unread_ids :message_ids',
+            'expression_attribute_values': {':message_ids': set(conversations[conversation_id][1])},
+            'condition_expression': 'attribute_exists(unread_ids)'
+        }
+        for conversation_id, was_cleared in zip(conversation_ids, cleared)
+        if not was_cleared and conversations[conversation_id][1]
+    ])
+
+def get_unread_counts(user_id):
+    # conversation_id -> (unread ids tracked, whether there are more)
+    items = query_all_with_retry(unread_counts_table,
+                                 KeyConditionExpression=Key('user_id').eq(user_id),
+                                 ProjectionExpression='conversation_id, unread_ids, unread_overflow')
+    return {
+        item['conversation_id']: (len(item.get('unread_ids', ())), item.get('unread_overflow', False))
+        for item in items
+    }
@@ -0,0 +1,87 @@
+import time
+from collections import OrderedDict
+from shared.dynamodb_client import get_dynamodb_table, batch_get_items_with_retry
+from shared.redis_client import get_redis_client
+
+users_table = get_dynamodb_table('Users')
+
+# Existence checks for user ids. Users are never deleted, so a positive answer is cached
+# for the life of the warm container (in an LRU) and for a day in Redis. Unknown ids are
+# cached too, but only briefly, so a user who registers right after a failed lookup is
+# soon visible. Misses from both tiers are resolved with one BatchGetItem.
+
+USER_CACHE_MAX_ENTRIES = 10000
+NEGATIVE_TTL_SECONDS = 5
+REDIS_POSITIVE_TTL_SECONDS = 86400
+
+# user_id -> (exists, expires_at); expires_at is None for users that exist
+local_user_cache = OrderedDict()
+
+def user_cache_key(user_id):
+    return f'user-exists:{user_id}'
+
+def get_local(user_id):
+    cached = local_user_cache.get(user_id)
+    if cached is None:
+        return None
+    exists, expires_at = cached
+    if expires_at is not None and expires_at <= time.time():
+        del local_user_cache[user_id]
+        return None
+    local_user_cache.move_to_end(user_id)
+    return exists
+
+def set_local(user_id, exists):
+    local_user_cache[user_id] = (exists, None if exists else time.time() + NEGATIVE_TTL_SECONDS)
+    local_user_cache.move_to_end(user_id)
+    while len(local_user_cache) > USER_CACHE_MAX_ENTRIES:
+        local_user_cache.popitem(last=False)
+
+def get_cached(redis_client, user_ids):
+    try:
+        values = redis_client.mget([user_cache_key(user_id) for user_id in user_ids])
+    except Exception as e:
+        print(f"Error reading user existence from Redis: {e}")
+        return {}
+    return {user_id: value == '1' for user_id, value in zip(user_ids, values) if value is not None}
+
+def set_cached(redis_client, existence):
+    try:
+        pipeline = redis_client.pipeline(transaction=False)
+        for user_id, exists in existence.items():
+            pipeline.set(user_cache_key(user_id), '1' if exists else '0',
+                         ex=REDIS_POSITIVE_TTL_SECONDS if exists else NEGATIVE_TTL_SECONDS)
+        pipeline.execute()
+    except Exception as e:
+        print(f"Error caching user existence in Redis: {e}")
+
+def load_existence(user_ids):
+    if not user_ids:
+        return {}
+    response = batch_get_items_with_retry(users_table, [{'user_id': user_id} for user_id in user_ids], projection=['user_id'])
+    found = {item['user_id'] for item in response['Responses'].get(users_table.name, [])}
+    return {user_id: user_id in found for user_id in user_ids}
+
+def users_exist(user_ids):
+    # Returns {user_id: exists} for every id given
+    existence = {}
+    for user_id in dict.fromkeys(user_ids):
+        exists = get_local(user_id)
+        if exists is not None:
+            existence[user_id] = exists
+
+    missing = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in existence]
+    if missing:
+        redis_client = get_redis_client()
+        cached = get_cached(redis_client, missing) if redis_client else {}
+        loaded = load_existence([user_id for user_id in missing if user_id not in cached])
+        if redis_client and loaded:
+            set_cached(redis_client, loaded)
+        for user_id, exists in {**cached, **loaded}.items():
+            set_local(user_id, exists)
+            existence[user_id] = exists
+
+    return existence
+
+def user_exists(user_id):
+    return users_exist([user_id])[user_id]
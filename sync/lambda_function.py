@@ -0,0 +1,170 @@
+import json
+import time
+from shared.dynamodb_client import get_dynamodb_table, batch_get_request_with_retry, batch_get_items_with_retry
+from shared.messages import fetch_messages, format_message
+from shared.group_timeline import query_merged_inbox, timeline_subscriptions
+from shared.group_members import get_user_groups
+from shared.pagination import encode_opaque_token, decode_opaque_token
+from shared.message_ids import message_id_floor
+from shared.read_state import READ_SETTLE_SECONDS, get_read_cursor, read_position, skip_read_entries
+
+users_table = get_dynamodb_table('Users')
+groups_table = get_dynamodb_table('Groups')
+
+USER_ATTRIBUTES = ['user_id', 'read_up_to', 'read_ids', 'timeline_groups', 'inbox_version', 'membership_version', 'received_messages']
+GROUP_ATTRIBUTES = ['group_id', 'last_message_id']
+SYNC_PAGE_SIZE = 200
+# BatchGetItem takes 100 keys: the user item plus up to 99 timeline heads
+MAX_TOKEN_GROUPS = 99
+MAX_TOKEN_SEEN_IDS = 100
+# Group ids and sort keys are far shorter; anything longer did not come from us
+MAX_TOKEN_KEY_LENGTH = 64
+
+# A sync token records what the client has already seen: a settled message sort key (m)
+# and the keys returned above it (s), the user's inbox_version (i), read cursor (r) and
+# membership_version (v), and the fan-out-on-read groups it last read (g). When none of
+# those moved, a poll costs one BatchGetItem for the user item and the heads of those
+# timelines. The groups in the token only say which heads to fetch up front; the user's
+# own timeline_groups decide which heads count.
+#
+# Like the read cursor, m trails real time by READ_SETTLE_SECONDS, so an entry that
+# lands late below a key already returned is still picked up. Keys returned above m are
+# carried in s and skipped, and while there are any every poll reads on: a late timeline
+# entry does not move its timeline's head.
+
+def decode_sync_token(sync_token):
+    # Raises ValueError for anything that is not a token we issued
+    token = decode_opaque_token(sync_token)
+    def is_key(value):
+        return isinstance(value, str) and 0 < len(value) <= MAX_TOKEN_KEY_LENGTH
+
+    if token.get('m') is not None and not is_key(token['m']):
+        raise ValueError('Malformed token')
+    for field in ('s', 'g'):
+        values = token.get(field) or []
+        if not isinstance(values, list) or not all(is_key(value) for value in values):
+            raise ValueError('Malformed token')
+    return token
+
+def read_sync_state(user_id, timeline_group_ids):
+    # The user item and the heads of the given timelines, in one request
+    requests = {users_table: ([{'user_id': user_id}], USER_ATTRIBUTES)}
+    if timeline_group_ids:
+        requests[groups_table] = ([{'group_id': group_id} for group_id in timeline_group_ids], GROUP_ATTRIBUTES)
+    responses = batch_get_request_with_retry(requests)
+
+    users = responses[users_table.name]
+    timeline_heads = {item['group_id']: item.get('last_message_id') for item in responses.get(groups_table.name, [])}
+    return (users[0] if users else None), timeline_heads
+
+def read_timeline_heads(group_ids):
+    response = batch_get_items_with_retry(groups_table, [{'group_id': group_id} for group_id in group_ids],
+                                          projection=GROUP_ATTRIBUTES)
+    return {item['group_id']: item.get('last_message_id') for item in response['Responses'][groups_table.name]}
+
+def settle_position(position, seen):
+    # Moves m up to the newest key seen, but no further than the settle margin; keys
+    # above it are returned to be carried in the token
+    settled = message_id_floor(int((time.time() - READ_SETTLE_SECONDS) * 1000))
+    position = max(position or '', min(max(seen, default=''), settled)) or None
+    held = sorted(key for key in seen if key > (position or ''))
+    if len(held) > MAX_TOKEN_SEEN_IDS:
+        # Too many to carry: the oldest give up their margin
+        position = held[-MAX_TOKEN_SEEN_IDS - 1]
+        held = held[-MAX_TOKEN_SEEN_IDS:]
+    return position, held
+
+def lambda_handler(event, context):
+    try:
+        if 'queryStringParameters' not in event or event['queryStringParameters'] is None:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'Missing query string parameters'})
+            }
+
+        user_id = event['queryStringParameters'].get('user_id')
+        if not user_id:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': 'Missing user_id in query string parameters'})
+            }
+
+        token = {}
+        sync_token = event['queryStringParameters'].get('sync_token')
+        if sync_token:
+            try:
+                token = decode_sync_token(sync_token)
+            except ValueError:
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps({'error': 'Invalid sync_token'})
+                }
+
+        user_item, timeline_heads = read_sync_state(user_id, sorted(set(token.get('g') or []))[:MAX_TOKEN_GROUPS])
+        if user_item is None:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'error': f'User with ID {user_id} does not exist'})
+            }
+        # Only the user's own timelines count; any the token did not name are read now
+        timeline_groups = sorted(timeline_subscriptions(user_item))
+        unread_heads = [group_id for group_id in timeline_groups if group_id not in timeline_heads]
+        if unread_heads:
+            timeline_heads.update(read_timeline_heads(unread_heads))
+        timeline_heads = [timeline_heads.get(group_id) for group_id in timeline_groups]
+
+        inbox_version = int(user_item.get('inbox_version', 0))
+        membership_version = int(user_item.get('membership_version', 0))
+        read_up_to = read_position(user_item)
+        # A first sync starts from the read cursor and skips what was read above it
+        last_seen = token.get('m') if token else get_read_cursor(user_item)
+        seen = set(token.get('s') or [])
+        newest_seen = max(seen, default=last_seen)
+
+        membership_changed = token.get('v') != membership_version
+        timelines_changed = any(head and (newest_seen is None or head > newest_seen) for head in timeline_heads)
+        messages_changed = token.get('i') != inbox_version or bool(seen) or timelines_changed or membership_changed
+
+        body = {'messages': []}
+        has_more = False
+        if messages_changed:
+            # The keys already returned above m come back too, and are dropped
+            inbox_entries = query_merged_inbox(user_item, after=last_seen, limit=SYNC_PAGE_SIZE + len(seen) + 1)
+            inbox_entries = [entry for entry in inbox_entries if entry['sort_key'] not in seen]
+            if len(inbox_entries) > SYNC_PAGE_SIZE:
+                inbox_entries = inbox_entries[:SYNC_PAGE_SIZE]
+                has_more = True
+            seen.update(entry['sort_key'] for entry in inbox_entries)
+            if not token:
+                inbox_entries = skip_read_entries(user_item, inbox_entries)
+            if inbox_entries:
+                body['messages'] = [format_message(message) for message in fetch_messages(inbox_entries)]
+            last_seen, seen = settle_position(last_seen, seen)
+
+        if 'r' not in token or token['r'] != read_up_to:
+            body['read_up_to'] = read_up_to
+        if membership_changed:
+            body['groups'] = get_user_groups(user_id)
+
+        body['has_more'] = has_more
+        body['sync_token'] = encode_opaque_token({
+            'm': last_seen,
+            's': sorted(seen),
+            # A partial page leaves the inbox version unrecorded so the next poll keeps reading
+            'i': None if has_more else inbox_version,
+            'r': read_up_to,
+            'v': membership_version,
+            'g': timeline_groups[:MAX_TOKEN_GROUPS]
+        })
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps(body)
+        }
+
+    except Exception as e:
+        print(f"Error syncing messages: {e}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'error': 'Failed to sync'})
+        }